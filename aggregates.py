@@ -0,0 +1,193 @@
+"""
+Derived word aggregates: table definitions and how messages are counted into them.
+
+Counting is split from writing so the same code serves both live ingestion
+(count a batch, upsert it) and the offline map-reduce rebuild (count row ranges
+in worker processes, upsert each partial result into fresh tables). Upserts add
+to what is already stored, so partial results can be written in any order.
+
+Counts are raw token totals: stopwords are counted like any other word and
+filtered out when top lists are read (see lexicon.py's stopwords table), so
+changing a stopword list never requires recounting history.
+
+Every table and index name takes a ``suffix`` so a rebuild can fill
+``word_index_rebuild`` and friends alongside the live tables before swapping them in.
+"""
+
+from collections import Counter
+
+from tokenizer import tokenize_many
+
+DISCORD_EPOCH_MS = 1420070400000
+
+# Bump whenever an aggregate table is added or its contents change meaning
+AGGREGATES_VERSION = "6"
+REBUILD_CHUNK_SIZE = 20000
+
+# table -> (CREATE TABLE, [CREATE INDEX, ...])
+AGGREGATE_SCHEMA = {
+    # word_index: how often each author used each word, per guild. The primary key
+    # serves word lookups, the author index serves per-user top-N reads.
+    "word_index": ('''
+CREATE TABLE IF NOT EXISTS word_index{suffix} (
+    guild_id INTEGER NOT NULL,
+    word TEXT NOT NULL,
+    author_id INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (guild_id, word, author_id)
+) WITHOUT ROWID
+''', ["CREATE INDEX IF NOT EXISTS idx_word_index_author{suffix} ON word_index{suffix} (guild_id, author_id, count DESC)"]),
+    # guild_word_counts: per-guild word totals, indexed for top-N reads.
+    "guild_word_counts": ('''
+CREATE TABLE IF NOT EXISTS guild_word_counts{suffix} (
+    guild_id INTEGER NOT NULL,
+    word TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (guild_id, word)
+) WITHOUT ROWID
+''', ["CREATE INDEX IF NOT EXISTS idx_guild_word_counts_top{suffix} ON guild_word_counts{suffix} (guild_id, count DESC)"]),
+    # word_hourly_counts: messages using a word per UTC hour (hours since the epoch).
+    "word_hourly_counts": ('''
+CREATE TABLE IF NOT EXISTS word_hourly_counts{suffix} (
+    guild_id INTEGER NOT NULL,
+    word TEXT NOT NULL,
+    hour_bucket INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (guild_id, word, hour_bucket)
+) WITHOUT ROWID
+''', []),
+    # word_first_seen: the earliest stored message using each word, per guild.
+    "word_first_seen": ('''
+CREATE TABLE IF NOT EXISTS word_first_seen{suffix} (
+    guild_id INTEGER NOT NULL,
+    word TEXT NOT NULL,
+    message_id INTEGER NOT NULL,
+    author_id INTEGER NOT NULL,
+    timestamp TEXT NOT NULL,
+    PRIMARY KEY (guild_id, word)
+) WITHOUT ROWID
+''', []),
+    # toxicity_counts / toxic_word_counts: toxic word usage per author, and per author and word.
+    "toxicity_counts": ('''
+CREATE TABLE IF NOT EXISTS toxicity_counts{suffix} (
+    guild_id INTEGER NOT NULL,
+    author_id INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (guild_id, author_id)
+) WITHOUT ROWID
+''', ["CREATE INDEX IF NOT EXISTS idx_toxicity_counts_top{suffix} ON toxicity_counts{suffix} (guild_id, count DESC)"]),
+    "toxic_word_counts": ('''
+CREATE TABLE IF NOT EXISTS toxic_word_counts{suffix} (
+    guild_id INTEGER NOT NULL,
+    author_id INTEGER NOT NULL,
+    word TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (guild_id, author_id, word)
+) WITHOUT ROWID
+''', ["CREATE INDEX IF NOT EXISTS idx_toxic_word_counts_top{suffix} ON toxic_word_counts{suffix} (guild_id, author_id, count DESC)"]),
+}
+AGGREGATE_TABLES = tuple(AGGREGATE_SCHEMA)
+
+UPSERT_WORD_INDEX_SQL = (
+    "INSERT INTO word_index{suffix} (guild_id, word, author_id, count) VALUES (?, ?, ?, ?) "
+    "ON CONFLICT(guild_id, word, author_id) DO UPDATE SET count = count + excluded.count"
+)
+UPSERT_GUILD_WORD_COUNTS_SQL = (
+    "INSERT INTO guild_word_counts{suffix} (guild_id, word, count) VALUES (?, ?, ?) "
+    "ON CONFLICT(guild_id, word) DO UPDATE SET count = count + excluded.count"
+)
+UPSERT_WORD_HOURLY_COUNTS_SQL = (
+    "INSERT INTO word_hourly_counts{suffix} (guild_id, word, hour_bucket, count) VALUES (?, ?, ?, ?) "
+    "ON CONFLICT(guild_id, word, hour_bucket) DO UPDATE SET count = count + excluded.count"
+)
+# Only replace the first-seen entry when an older message arrives (e.g. initcache backfills)
+UPSERT_WORD_FIRST_SEEN_SQL = (
+    "INSERT INTO word_first_seen{suffix} (guild_id, word, message_id, author_id, timestamp) VALUES (?, ?, ?, ?, ?) "
+    "ON CONFLICT(guild_id, word) DO UPDATE SET message_id = excluded.message_id, author_id = excluded.author_id, timestamp = excluded.timestamp "
+    "WHERE (excluded.timestamp, excluded.message_id) < (word_first_seen{suffix}.timestamp, word_first_seen{suffix}.message_id)"
+)
+UPSERT_TOXICITY_COUNTS_SQL = (
+    "INSERT INTO toxicity_counts{suffix} (guild_id, author_id, count) VALUES (?, ?, ?) "
+    "ON CONFLICT(guild_id, author_id) DO UPDATE SET count = count + excluded.count"
+)
+UPSERT_TOXIC_WORD_COUNTS_SQL = (
+    "INSERT INTO toxic_word_counts{suffix} (guild_id, author_id, word, count) VALUES (?, ?, ?, ?) "
+    "ON CONFLICT(guild_id, author_id, word) DO UPDATE SET count = count + excluded.count"
+)
+
+
+def create_aggregate_tables(cur, suffix="", indexes=True):
+    for table, (create_sql, index_sqls) in AGGREGATE_SCHEMA.items():
+        cur.execute(create_sql.format(suffix=suffix))
+        if indexes:
+            for index_sql in index_sqls:
+                cur.execute(index_sql.format(suffix=suffix))
+
+
+def create_aggregate_indexes(cur, suffix=""):
+    for _, index_sqls in AGGREGATE_SCHEMA.values():
+        for index_sql in index_sqls:
+            cur.execute(index_sql.format(suffix=suffix))
+
+
+class AggregateCounts:
+    """
+    Counts for a set of messages, ready to be added to the aggregate tables.
+    Instances are plain data, so worker processes can return them.
+    """
+
+    def __init__(self):
+        self.word_counts = Counter()
+        self.hourly_counts = Counter()
+        self.first_seen = {}
+        self.toxic_counts = Counter()
+        self.messages = 0
+
+    def add(self, rows, toxic_words):
+        """
+        Count every token of message rows of (message_id, channel_id, author_id, content, timestamp, guild_id);
+        rows without a guild_id are skipped. Returns self.
+        """
+        rows = [row for row in rows if row[5] is not None]
+        self.messages += len(rows)
+        word_counts = self.word_counts
+        hourly_counts = self.hourly_counts
+        first_seen = self.first_seen
+        toxic_counts = self.toxic_counts
+        for row, tokens in zip(rows, tokenize_many(row[3] for row in rows)):
+            if not tokens:
+                continue
+            guild_id, author_id = row[5], row[2]
+            order = (row[4], row[0])
+            for w in set(tokens):
+                seen = first_seen.get((guild_id, w))
+                if seen is None or order < (seen[2], seen[0]):
+                    first_seen[(guild_id, w)] = (row[0], author_id, row[4])
+            for w in tokens:
+                word_counts[(guild_id, w, author_id)] += 1
+                if w in toxic_words:
+                    toxic_counts[(guild_id, author_id, w)] += 1
+            # graphs count messages using a word, not occurrences
+            bucket = ((row[0] >> 22) + DISCORD_EPOCH_MS) // 3600000
+            for w in set(tokens):
+                hourly_counts[(guild_id, w, bucket)] += 1
+        return self
+
+    def write(self, cur, suffix=""):
+        """Add these counts to the aggregate tables (those ending in ``suffix``)."""
+        if self.word_counts:
+            guild_counts = Counter()
+            for (g, w, _), c in self.word_counts.items():
+                guild_counts[(g, w)] += c
+            cur.executemany(UPSERT_WORD_INDEX_SQL.format(suffix=suffix), ((g, w, a, c) for (g, w, a), c in self.word_counts.items()))
+            cur.executemany(UPSERT_GUILD_WORD_COUNTS_SQL.format(suffix=suffix), ((g, w, c) for (g, w), c in guild_counts.items()))
+        if self.hourly_counts:
+            cur.executemany(UPSERT_WORD_HOURLY_COUNTS_SQL.format(suffix=suffix), ((g, w, b, c) for (g, w, b), c in self.hourly_counts.items()))
+        if self.first_seen:
+            cur.executemany(UPSERT_WORD_FIRST_SEEN_SQL.format(suffix=suffix), ((g, w) + seen for (g, w), seen in self.first_seen.items()))
+        if self.toxic_counts:
+            author_totals = Counter()
+            for (g, a, _), c in self.toxic_counts.items():
+                author_totals[(g, a)] += c
+            cur.executemany(UPSERT_TOXIC_WORD_COUNTS_SQL.format(suffix=suffix), ((g, a, w, c) for (g, a, w), c in self.toxic_counts.items()))
+            cur.executemany(UPSERT_TOXICITY_COUNTS_SQL.format(suffix=suffix), ((g, a, c) for (g, a), c in author_totals.items()))
@@ -0,0 +1,317 @@
+"""
+Word analytics over wordcount.db, independent of Discord.
+
+Every query is a plain function taking a cursor first, so the bot runs them
+through ``database.read(fn, ...)`` and scripts can call them on any sqlite3
+connection. They return ids and numbers; turning ids into names is up to the caller.
+
+Word counts include stopwords; the top-N lists leave out the default
+stopwords and the guild's own (the ``stopwords`` table, see lexicon.py).
+
+Multi-word searches ("skill issue", "near skill issue") are answered from the
+messages_fts full-text index and count matching messages. Single words are
+answered from the word aggregates and count occurrences.
+
+Also usable from the command line:
+
+    python analytics.py [--db wordcount.db] [--guild ID] [--json] [--time] <command> ...
+
+e.g. ``python analytics.py top10``, ``python analytics.py count "skill issue"``,
+``python analytics.py mylist 1234``, ``python analytics.py toxicityrank --user 1234``.
+"""
+
+import argparse
+import datetime
+import json
+import re
+import sqlite3
+import sys
+import time
+
+from aggregates import DISCORD_EPOCH_MS
+from lexicon import DEFAULT_STOPWORDS_GUILD
+
+FTS_NEAR_DISTANCE = 10
+_NEAR_RE = re.compile(r"near(?::(\d+))?$", re.IGNORECASE)
+
+# anti-join against the default and the guild's own stopwords; the alias of the
+# aggregate being filtered is ``a`` and the guild id is bound twice
+_NOT_STOPWORD = (
+    f"NOT EXISTS (SELECT 1 FROM stopwords s WHERE s.guild_id IN ({DEFAULT_STOPWORDS_GUILD}, ?) AND s.word = a.word)"
+)
+
+
+def fts_query(text):
+    """
+    FTS5 MATCH expression for a multi-word search, or None for a single word.
+    "skill issue" matches the exact phrase; "near skill issue" (or "near:5 skill issue")
+    matches the words within 10 (or 5) words of each other, in any order.
+    """
+    terms = text.split()
+    near = _NEAR_RE.match(terms[0]) if len(terms) > 2 else None
+    if near:
+        terms = terms[1:]
+    if len(terms) < 2:
+        return None
+    if near:
+        quoted = " ".join('"' + term.replace('"', '""') + '"' for term in terms)
+        return f"NEAR({quoted}, {int(near.group(1) or FTS_NEAR_DISTANCE)})"
+    return '"' + " ".join(terms).replace('"', '""') + '"'
+
+
+def has_fts(cur):
+    return cur.execute("SELECT 1 FROM sqlite_master WHERE name = 'messages_fts'").fetchone() is not None
+
+
+def bucket_datetime(bucket):
+    """UTC datetime at the start of an hour bucket."""
+    return datetime.datetime.fromtimestamp(bucket * 3600, datetime.timezone.utc)
+
+
+def _bucket_message_id(bucket):
+    # smallest snowflake created in that hour
+    return max(0, bucket * 3600000 - DISCORD_EPOCH_MS) << 22
+
+
+# --- counts ---
+
+def word_counts(cur, guild_id, word):
+    """(author_id, count) rows for a word or phrase, most frequent first."""
+    query = fts_query(word)
+    if query is not None:
+        return cur.execute(
+            "SELECT m.author_id, COUNT(*) FROM messages_fts CROSS JOIN messages m ON m.message_id = messages_fts.rowid "
+            "WHERE messages_fts MATCH ? AND m.guild_id = ? GROUP BY m.author_id ORDER BY COUNT(*) DESC",
+            (query, guild_id)
+        ).fetchall()
+    return cur.execute(
+        "SELECT author_id, count FROM word_index WHERE guild_id = ? AND word = ? ORDER BY count DESC",
+        (guild_id, word)
+    ).fetchall()
+
+
+def user_word_count(cur, guild_id, word, author_id):
+    """How often one author used a word (or in how many messages, for a phrase)."""
+    query = fts_query(word)
+    if query is not None:
+        row = cur.execute(
+            "SELECT COUNT(*) FROM messages_fts CROSS JOIN messages m ON m.message_id = messages_fts.rowid "
+            "WHERE messages_fts MATCH ? AND m.guild_id = ? AND m.author_id = ?",
+            (query, guild_id, author_id)
+        ).fetchone()
+    else:
+        row = cur.execute(
+            "SELECT count FROM word_index WHERE guild_id = ? AND word = ? AND author_id = ?",
+            (guild_id, word, author_id)
+        ).fetchone()
+    return row[0] if row else 0
+
+
+def top_words(cur, guild_id, limit=10):
+    """(word, count) rows of the guild's most used words, stopwords left out."""
+    return cur.execute(
+        f"SELECT a.word, a.count FROM guild_word_counts a WHERE a.guild_id = ? AND {_NOT_STOPWORD} "
+        "ORDER BY a.count DESC LIMIT ?",
+        (guild_id, guild_id, limit)
+    ).fetchall()
+
+
+def user_top_words(cur, guild_id, author_id, limit=10):
+    """(word, count) rows of one author's most used words, stopwords left out."""
+    return cur.execute(
+        f"SELECT a.word, a.count FROM word_index a WHERE a.guild_id = ? AND a.author_id = ? AND {_NOT_STOPWORD} "
+        "ORDER BY a.count DESC LIMIT ?",
+        (guild_id, author_id, guild_id, limit)
+    ).fetchall()
+
+
+def first_use(cur, guild_id, word):
+    """(author_id, timestamp) of the earliest stored message using a word, or None."""
+    return cur.execute(
+        "SELECT author_id, timestamp FROM word_first_seen WHERE guild_id = ? AND word = ?",
+        (guild_id, word)
+    ).fetchone()
+
+
+# --- usage over time ---
+
+def usage_buckets(cur, guild_id, word, start_bucket=None):
+    """(hour_bucket, messages) rows for a word or phrase, optionally from start_bucket onwards."""
+    query = fts_query(word)
+    if query is not None:
+        return cur.execute(
+            f"SELECT ((m.message_id >> 22) + {DISCORD_EPOCH_MS}) / 3600000 AS bucket, COUNT(*) "
+            "FROM messages_fts CROSS JOIN messages m ON m.message_id = messages_fts.rowid "
+            "WHERE messages_fts MATCH ? AND m.guild_id = ? AND m.message_id >= ? GROUP BY bucket",
+            (query, guild_id, _bucket_message_id(start_bucket or 0))
+        ).fetchall()
+    if start_bucket is None:
+        return cur.execute(
+            "SELECT hour_bucket, count FROM word_hourly_counts WHERE guild_id = ? AND word = ?",
+            (guild_id, word)
+        ).fetchall()
+    return cur.execute(
+        "SELECT hour_bucket, count FROM word_hourly_counts WHERE guild_id = ? AND word = ? AND hour_bucket >= ?",
+        (guild_id, word, start_bucket)
+    ).fetchall()
+
+
+def daily_usage(cur, guild_id, word, now=None):
+    """{"HH:00": messages} for today (UTC)."""
+    today_start = int(now or time.time()) // 86400 * 24
+    usage = {}
+    for bucket, count in usage_buckets(cur, guild_id, word, today_start):
+        if bucket >= today_start + 24:
+            continue
+        hour = bucket_datetime(bucket).strftime("%H:00")
+        usage[hour] = usage.get(hour, 0) + count
+    return usage
+
+
+def weekly_usage(cur, guild_id, word, now=None):
+    """{"Mon 01/31": messages} for the last 7 days (UTC)."""
+    week_start = (int(now or time.time()) // 86400 - 6) * 24
+    usage = {}
+    for bucket, count in usage_buckets(cur, guild_id, word, week_start):
+        day = bucket_datetime(bucket).strftime("%a %m/%d")
+        usage[day] = usage.get(day, 0) + count
+    return usage
+
+
+def alltime_usage(cur, guild_id, word):
+    """{"YYYY-MM-DD": messages} over all history."""
+    usage = {}
+    for bucket, count in usage_buckets(cur, guild_id, word):
+        day = bucket_datetime(bucket).strftime("%Y-%m-%d")
+        usage[day] = usage.get(day, 0) + count
+    return usage
+
+
+# --- toxicity ---
+
+def toxicity_leaderboard(cur, guild_id, limit=10):
+    """(author_id, toxic words) rows, most toxic first."""
+    return cur.execute(
+        "SELECT author_id, count FROM toxicity_counts WHERE guild_id = ? ORDER BY count DESC LIMIT ?",
+        (guild_id, limit)
+    ).fetchall()
+
+
+def user_toxicity(cur, guild_id, author_id, limit=10):
+    """(rank, [(word, count), ...]) for one author; rank is None if they have no toxic words."""
+    words = cur.execute(
+        "SELECT word, count FROM toxic_word_counts WHERE guild_id = ? AND author_id = ? ORDER BY count DESC LIMIT ?",
+        (guild_id, author_id, limit)
+    ).fetchall()
+    if not words:
+        return None, []
+    (rank,) = cur.execute(
+        "SELECT 1 + COUNT(*) FROM toxicity_counts WHERE guild_id = ? "
+        "AND count > (SELECT count FROM toxicity_counts WHERE guild_id = ? AND author_id = ?)",
+        (guild_id, guild_id, author_id)
+    ).fetchone()
+    return rank, words
+
+
+# --- command line ---
+
+def _guild_ids(cur):
+    return [g for (g,) in cur.execute("SELECT DISTINCT guild_id FROM toxicity_counts UNION SELECT DISTINCT guild_id FROM guild_word_counts")]
+
+
+def _run_command(cur, args):
+    guild_id = args.guild
+    if args.command == "count":
+        return word_counts(cur, guild_id, args.word.lower())
+    if args.command == "usercount":
+        return user_word_count(cur, guild_id, args.word.lower(), args.user)
+    if args.command == "top10":
+        return top_words(cur, guild_id, args.limit)
+    if args.command == "mylist":
+        return user_top_words(cur, guild_id, args.user, args.limit)
+    if args.command == "daily":
+        return daily_usage(cur, guild_id, args.word.lower())
+    if args.command == "thisweek":
+        return weekly_usage(cur, guild_id, args.word.lower())
+    if args.command == "alltime":
+        return alltime_usage(cur, guild_id, args.word.lower())
+    if args.command == "whoinvented":
+        return first_use(cur, guild_id, args.word.lower())
+    if args.command == "toxicityrank":
+        if args.user is not None:
+            rank, words = user_toxicity(cur, guild_id, args.user, args.limit)
+            return {"rank": rank, "words": words}
+        return toxicity_leaderboard(cur, guild_id, args.limit)
+
+
+def _print_result(result):
+    if isinstance(result, dict):
+        for key, value in result.items():
+            if isinstance(value, list):
+                print(f"{key}:")
+                _print_result(value)
+            else:
+                print(f"{key}\t{value}")
+    elif isinstance(result, list):
+        for row in result:
+            print("\t".join(str(v) for v in row))
+    elif isinstance(result, tuple):
+        print("\t".join(str(v) for v in result))
+    elif result is not None:
+        print(result)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the bot's word analytics against a wordcount.db file.")
+    parser.add_argument("--db", default="wordcount.db")
+    parser.add_argument("--guild", type=int, default=None, help="guild id (may be left out if the database has one guild)")
+    parser.add_argument("--json", action="store_true", help="print the result as JSON")
+    parser.add_argument("--time", action="store_true", help="report query latency on stderr")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name in ("count", "daily", "thisweek", "alltime", "whoinvented"):
+        sub.add_parser(name).add_argument("word")
+    usercount = sub.add_parser("usercount")
+    usercount.add_argument("word")
+    usercount.add_argument("user", type=int)
+    sub.add_parser("top10").add_argument("--limit", type=int, default=10)
+    mylist = sub.add_parser("mylist")
+    mylist.add_argument("user", type=int)
+    mylist.add_argument("--limit", type=int, default=10)
+    toxicityrank = sub.add_parser("toxicityrank")
+    toxicityrank.add_argument("--user", type=int, default=None)
+    toxicityrank.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    try:
+        conn = sqlite3.connect(f"file:{args.db}?mode=ro", uri=True)
+    except sqlite3.OperationalError as e:
+        sys.exit(f"cannot open {args.db}: {e}")
+    cur = conn.cursor()
+    if args.guild is None:
+        guilds = _guild_ids(cur)
+        if len(guilds) != 1:
+            sys.exit(f"--guild is required; guilds in {args.db}: {', '.join(map(str, guilds)) or 'none'}")
+        args.guild = guilds[0]
+    word = getattr(args, "word", None)
+    if word is not None and fts_query(word) is not None and not has_fts(cur):
+        sys.exit("phrase search needs the messages_fts index; start the bot once to migrate the database.")
+    if word is not None and fts_query(word) is not None and cur.execute(
+        "SELECT 1 FROM meta WHERE key = 'fts_backfill_until'"
+    ).fetchone():
+        print("warning: the bot is still indexing older messages; phrase results are partial.", file=sys.stderr)
+
+    start = time.perf_counter()
+    result = _run_command(cur, args)
+    elapsed = (time.perf_counter() - start) * 1000
+    conn.close()
+
+    if args.json:
+        print(json.dumps(result))
+    else:
+        _print_result(result)
+    if args.time:
+        print(f"{args.command}: {elapsed:.2f} ms", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
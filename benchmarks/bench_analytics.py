@@ -0,0 +1,244 @@
+"""
+Analytics benchmark suite: ingestion and every command's data path on synthetic corpora.
+
+For each size a fresh wordcount.db is built in a temporary directory by
+importing main (so the real migrations run) and feeding benchmarks/corpus.py
+rows through main.store_messages in ingestion-sized batches. A second process
+then times each analytics query the bot commands run. Each phase runs in its
+own process, so its peak RSS is its own.
+
+Results go to a JSON file (one entry per size) so runs can be diffed for regressions.
+
+    python benchmarks/bench_analytics.py [--sizes 10k,1m,10m] [--repeat 20] [--output benchmarks/results/bench_analytics.json]
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, HERE)
+
+from corpus import Corpus, parse_size  # noqa: E402
+
+
+def peak_rss_mb():
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def summarize_ms(samples):
+    return {
+        "min_ms": round(min(samples), 3),
+        "median_ms": round(statistics.median(samples), 3),
+        "p95_ms": round(percentile(samples, 95), 3),
+        "max_ms": round(max(samples), 3),
+    }
+
+
+# --- phases (run in child processes, inside the benchmark's working directory) ---
+
+def phase_ingest(rows, batch_size, seed):
+    """Build ./wordcount.db through the bot's own ingestion path."""
+    import main
+    main.database.close()
+    conn = sqlite3.connect("wordcount.db")
+    conn.execute("PRAGMA journal_mode=WAL;")
+    cur = conn.cursor()
+    corpus = Corpus(seed=seed)
+    batch_ms = []
+    stored = 0
+    generate_s = 0.0
+    start = time.perf_counter()
+    batches = corpus.batches(rows, batch_size)
+    while True:
+        t = time.perf_counter()
+        batch = next(batches, None)
+        generate_s += time.perf_counter() - t
+        if batch is None:
+            break
+        t = time.perf_counter()
+        stored += main.store_messages(cur, batch)
+        conn.commit()
+        batch_ms.append((time.perf_counter() - t) * 1000)
+    ingest_s = time.perf_counter() - start - generate_s
+    conn.close()
+    return {
+        "rows": stored,
+        "batch_size": batch_size,
+        "seconds": round(ingest_s, 3),
+        "messages_per_second": round(stored / ingest_s, 1) if ingest_s else 0.0,
+        "batch": summarize_ms(batch_ms),
+        "generate_seconds": round(generate_s, 3),
+        "db_mb": round(os.path.getsize("wordcount.db") / (1024 * 1024), 1),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def pick_targets(cur):
+    """The busiest guild, its busiest author, and words/phrases of different popularity."""
+    (guild,) = cur.execute(
+        "SELECT guild_id FROM guild_word_counts GROUP BY guild_id ORDER BY SUM(count) DESC LIMIT 1"
+    ).fetchone()
+    (author,) = cur.execute(
+        "SELECT author_id FROM toxicity_counts WHERE guild_id = ? ORDER BY count DESC LIMIT 1", (guild,)
+    ).fetchone()
+    ranked = cur.execute("SELECT word FROM guild_word_counts WHERE guild_id = ? ORDER BY count DESC", (guild,)).fetchall()
+    words = {"hot": ranked[0][0], "mid": ranked[len(ranked) // 100][0], "rare": ranked[-1][0]}
+    content = cur.execute(
+        "SELECT content FROM messages WHERE guild_id = ? AND length(content) > 40 ORDER BY message_id DESC LIMIT 1", (guild,)
+    ).fetchone()[0].split()
+    phrase = f"{content[1]} {content[2]}"
+    (newest,) = cur.execute("SELECT MAX(message_id) FROM messages").fetchone()
+    now = ((newest >> 22) + 1420070400000) / 1000
+    return guild, author, words, phrase, now
+
+
+def phase_queries(repeat):
+    """Time every analytics query against ./wordcount.db."""
+    import analytics
+    conn = sqlite3.connect("file:wordcount.db?mode=ro", uri=True)
+    cur = conn.cursor()
+    guild, author, words, phrase, now = pick_targets(cur)
+    hot = words["hot"]
+    cases = [
+        ("count", analytics.word_counts, (guild, hot)),
+        ("count:mid", analytics.word_counts, (guild, words["mid"])),
+        ("count:rare", analytics.word_counts, (guild, words["rare"])),
+        ("count:phrase", analytics.word_counts, (guild, phrase)),
+        ("count:near", analytics.word_counts, (guild, f"near {phrase}")),
+        ("usercount", analytics.user_word_count, (guild, hot, author)),
+        ("usercount:phrase", analytics.user_word_count, (guild, phrase, author)),
+        ("top10", analytics.top_words, (guild,)),
+        ("mylist", analytics.user_top_words, (guild, author)),
+        ("daily", analytics.daily_usage, (guild, hot, now)),
+        ("thisweek", analytics.weekly_usage, (guild, hot, now)),
+        ("alltime", analytics.alltime_usage, (guild, hot)),
+        ("alltime:phrase", analytics.alltime_usage, (guild, phrase)),
+        ("whoinvented", analytics.first_use, (guild, hot)),
+        ("toxicityrank", analytics.toxicity_leaderboard, (guild,)),
+        ("toxicityrank:user", analytics.user_toxicity, (guild, author)),
+    ]
+    results = {}
+    for name, fn, args in cases:
+        samples = []
+        for _ in range(repeat + 1):
+            t = time.perf_counter()
+            fn(cur, *args)
+            samples.append((time.perf_counter() - t) * 1000)
+        results[name] = dict(summarize_ms(samples[1:]), first_ms=round(samples[0], 3))
+    conn.close()
+    return {
+        "targets": {"guild": guild, "author": author, "words": words, "phrase": phrase},
+        "commands": results,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+# --- driver ---
+
+def run_phase(workdir, *args):
+    out = os.path.join(workdir, "phase.json")
+    subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--phase", *map(str, args), "--phase-output", out],
+        cwd=workdir, check=True, stdout=subprocess.DEVNULL,
+    )
+    with open(out, "r", encoding="utf-8") as file:
+        return json.load(file)
+
+
+def run_size(rows, args):
+    workdir = tempfile.mkdtemp(prefix="bench_analytics_")
+    try:
+        for name in ("stopwords.txt", "badwords_en.txt"):
+            shutil.copy(os.path.join(ROOT, name), workdir)
+        ingest = run_phase(workdir, "ingest", rows, args.batch_size, args.seed)
+        queries = run_phase(workdir, "queries", args.repeat)
+        return {"size": rows, "ingest": ingest, "queries": queries}
+    finally:
+        if args.keep:
+            print(f"  kept {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        "commit": commit or None,
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    }
+
+
+def print_size(result):
+    ingest = result["ingest"]
+    print(
+        f"  ingest: {ingest['rows']:,} rows in {ingest['seconds']:.1f}s ({ingest['messages_per_second']:,.0f} msg/s), "
+        f"batch p95 {ingest['batch']['p95_ms']:.1f}ms, db {ingest['db_mb']} MB, peak RSS {ingest['peak_rss_mb']} MB"
+    )
+    for name, timing in result["queries"]["commands"].items():
+        print(f"  {name:<18} median {timing['median_ms']:9.3f}ms  p95 {timing['p95_ms']:9.3f}ms  first {timing['first_ms']:9.3f}ms")
+    print(f"  queries peak RSS {result['queries']['peak_rss_mb']} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="10k,1m,10m", help="comma-separated row counts, e.g. 10k,1m,10m")
+    parser.add_argument("--repeat", type=int, default=20, help="timed runs per query (after one untimed first run)")
+    parser.add_argument("--batch-size", type=int, default=200, help="rows per store_messages transaction")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=os.path.join(HERE, "results", "bench_analytics.json"))
+    parser.add_argument("--keep", action="store_true", help="keep the generated databases")
+    parser.add_argument("--phase", nargs="+", help=argparse.SUPPRESS)
+    parser.add_argument("--phase-output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.phase:
+        name, *params = args.phase
+        if name == "ingest":
+            result = phase_ingest(int(params[0]), int(params[1]), int(params[2]))
+        else:
+            result = phase_queries(int(params[0]))
+        with open(args.phase_output, "w", encoding="utf-8") as file:
+            json.dump(result, file)
+        return
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    report = {"environment": environment(), "results": []}
+    for size in (parse_size(s) for s in args.sizes.split(",")):
+        print(f"{size:,} messages")
+        result = run_size(size, args)
+        print_size(result)
+        report["results"].append(result)
+        # written after every size so a long run still leaves results behind
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+    print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Crawler benchmark: messages ingested per minute at different concurrency levels.
+
+Drives crawler.ChannelCrawler against fake channels with simulated request
+latency and per-channel rate-limit buckets. Batches go to a single writer
+that inserts them into a temporary SQLite database.
+
+    python benchmarks/bench_crawler.py [--channels 8] [--messages 3000] [--latency 0.05]
+"""
+
+import argparse
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from crawler import ChannelCrawler, CrawlJob  # noqa: E402
+from fakes import FakeChannel, FakeGuild, snowflake  # noqa: E402
+
+
+def make_guild(channels, messages, latency, rate_limit):
+    guild = FakeGuild(1)
+    for i in range(channels):
+        channel_id = snowflake(1600000000000 + i * 86400000, i)
+        guild.text_channels.append(FakeChannel(channel_id, guild, messages, latency=latency, rate_limit=rate_limit))
+    return guild
+
+
+async def crawl_once(guild, concurrency, pages_per_second):
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE messages (message_id INTEGER PRIMARY KEY, channel_id INTEGER, author_id INTEGER, content TEXT, timestamp TEXT, guild_id INTEGER)")
+
+    async def write(batch):
+        db.executemany(
+            "INSERT OR IGNORE INTO messages VALUES (?, ?, ?, ?, ?, ?)",
+            [(m.id, m.channel.id, m.author.id, m.content, m.created_at.isoformat(), m.guild.id) for m in batch.messages]
+        )
+        db.commit()
+
+    crawler = ChannelCrawler(concurrency=concurrency, max_pages_per_second=pages_per_second)
+    try:
+        await crawler.run([CrawlJob(ch) for ch in guild.text_channels], write)
+        stored = db.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+    finally:
+        db.close()
+        os.remove(path)
+    return crawler, stored
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--channels", type=int, default=8)
+    parser.add_argument("--messages", type=int, default=3000, help="messages per channel")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per history request")
+    parser.add_argument("--bucket", type=str, default="5/1", help="per-channel rate limit as requests/seconds")
+    parser.add_argument("--pages-per-second", type=float, default=None)
+    parser.add_argument("--concurrency", type=str, default="1,2,4,8")
+    args = parser.parse_args()
+
+    requests, per = args.bucket.split("/")
+    rate_limit = (int(requests), float(per))
+    expected = args.channels * args.messages
+    print(f"{args.channels} channels x {args.messages} messages, {args.latency * 1000:.0f}ms/request, bucket {args.bucket}")
+
+    baseline = None
+    for concurrency in (int(c) for c in args.concurrency.split(",")):
+        guild = make_guild(args.channels, args.messages, args.latency, rate_limit)
+        crawler, stored = asyncio.run(crawl_once(guild, concurrency, args.pages_per_second))
+        if stored != expected:
+            sys.exit(f"concurrency {concurrency}: stored {stored} of {expected} messages")
+        rate = crawler.messages_per_minute
+        baseline = baseline or rate
+        print(f"concurrency={concurrency:<3} {crawler.elapsed:7.2f}s  {crawler.pages:5d} pages  {rate:12,.0f} msg/min  ({rate / baseline:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
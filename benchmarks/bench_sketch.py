@@ -0,0 +1,165 @@
+"""
+Live top-10 benchmark: Space-Saving summaries (sketch.py) against exact counts.
+
+Feeds the same synthetic corpus (benchmarks/corpus.py) through GuildSketches at
+several capacities and through an exact Counter per guild, then compares their
+filtered top 10 for every guild. Checks that the documented error bound holds
+for every monitored word, and reports top-10 recall, the largest error seen
+against N / k, ingestion and query speed, and summary size.
+
+Results go to a JSON file so runs can be diffed for regressions.
+
+    python benchmarks/bench_sketch.py [--rows 200k] [--capacities 256,1024,2048,8192] [--output benchmarks/results/bench_sketch.json]
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from collections import Counter, defaultdict
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, HERE)
+
+from cache import estimate_size  # noqa: E402
+from corpus import Corpus, parse_size  # noqa: E402
+from lexicon import load_stopwords  # noqa: E402
+from sketch import GuildSketches  # noqa: E402
+from tokenizer import tokenize_many  # noqa: E402
+
+
+def exact_counts(batches):
+    counts = defaultdict(Counter)
+    for batch in batches:
+        for row, tokens in zip(batch, tokenize_many(row[3] for row in batch)):
+            counts[row[5]].update(tokens)
+    return counts
+
+
+def exact_top(counter, stopwords, n=10):
+    return [(w, c) for w, c in counter.most_common(n + len(stopwords)) if w not in stopwords][:n]
+
+
+def check_guild(summary, counter, stopwords):
+    """Bound violations, largest error and top-10 agreement for one guild."""
+    violations = 0
+    max_error = 0
+    for word, estimate in summary.counts.items():
+        true = counter[word]
+        error = estimate - true
+        max_error = max(max_error, error)
+        # never below the true count, never more above it than its own error, which is at most N / k
+        if error < 0 or error > summary.errors[word] or summary.errors[word] > summary.max_error:
+            violations += 1
+    # any word that occurred more than N / k times must be monitored
+    missing_heavy = sum(1 for word, c in counter.items() if c > summary.max_error and word not in summary.counts)
+
+    exact = exact_top(counter, stopwords)
+    live = summary.top(10, exclude=(stopwords,))
+    # ties at the 10th place: any word counted at least as often as the exact 10th is a correct pick
+    cutoff = exact[-1][1] if exact else 0
+    correct = sum(1 for w, _, _, _ in live if counter[w] >= cutoff)
+    guaranteed_wrong = sum(1 for w, _, _, sure in live if sure and counter[w] < cutoff)
+    return {
+        "violations": violations,
+        "missing_heavy_hitters": missing_heavy,
+        "max_error": max_error,
+        "recall": correct / len(exact) if exact else 1.0,
+        "same_order": [w for w, _ in exact] == [w for w, _, _, _ in live],
+        "guaranteed": sum(1 for *_, sure in live if sure),
+        "guaranteed_wrong": guaranteed_wrong,
+    }
+
+
+def run_capacity(capacity, batches, exact, stopwords, repeat):
+    sketches = GuildSketches(capacity=capacity)
+    start = time.perf_counter()
+    for batch in batches:
+        sketches.add_rows(batch)
+    add_s = time.perf_counter() - start
+    tokens = sum(s.total for s in sketches.sketches.values())
+
+    guilds = {}
+    query_ms = []
+    for guild_id, summary in sketches.sketches.items():
+        for _ in range(repeat):
+            t = time.perf_counter()
+            summary.top(10, exclude=(stopwords,))
+            query_ms.append((time.perf_counter() - t) * 1000)
+        guilds[guild_id] = dict(
+            check_guild(summary, exact[guild_id], stopwords),
+            tokens=summary.total,
+            bound=round(summary.max_error, 2),
+            vocabulary=len(exact[guild_id]),
+        )
+    busiest = max(guilds.values(), key=lambda g: g["tokens"])
+    return {
+        "capacity": capacity,
+        "guilds": len(guilds),
+        "tokens": tokens,
+        "add_seconds": round(add_s, 3),
+        "tokens_per_second": round(tokens / add_s) if add_s else 0,
+        "top10_median_ms": round(statistics.median(query_ms), 3),
+        "top10_max_ms": round(max(query_ms), 3),
+        "summary_kb": round(max(estimate_size(s.to_dict()) for s in sketches.sketches.values()) / 1024, 1),
+        "violations": sum(g["violations"] for g in guilds.values()),
+        "missing_heavy_hitters": sum(g["missing_heavy_hitters"] for g in guilds.values()),
+        "guaranteed_wrong": sum(g["guaranteed_wrong"] for g in guilds.values()),
+        "min_recall": round(min(g["recall"] for g in guilds.values()), 3),
+        "mean_recall": round(statistics.mean(g["recall"] for g in guilds.values()), 3),
+        "same_order_guilds": sum(g["same_order"] for g in guilds.values()),
+        "busiest_guild": {k: busiest[k] for k in ("tokens", "vocabulary", "bound", "max_error", "recall", "guaranteed")},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", default="200k", help="messages to generate, e.g. 200k")
+    parser.add_argument("--capacities", default="256,1024,2048,8192", help="comma-separated summary capacities (k)")
+    parser.add_argument("--repeat", type=int, default=20, help="timed top-10 reads per guild")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=os.path.join(HERE, "results", "bench_sketch.json"))
+    args = parser.parse_args()
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+
+    rows = parse_size(args.rows)
+    stopwords = load_stopwords(os.path.join(ROOT, "stopwords.txt"))
+    batches = list(Corpus(seed=args.seed).batches(rows, 200))
+    start = time.perf_counter()
+    exact = exact_counts(batches)
+    exact_s = time.perf_counter() - start
+    print(f"{rows:,} messages, {len(exact)} guilds, exact Counter in {exact_s:.1f}s")
+
+    report = {
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        },
+        "rows": rows,
+        "exact_seconds": round(exact_s, 3),
+        "results": [],
+    }
+    for capacity in (int(c) for c in args.capacities.split(",")):
+        result = run_capacity(capacity, batches, exact, stopwords, args.repeat)
+        busiest = result["busiest_guild"]
+        print(
+            f"  k={capacity:<6} recall min {result['min_recall']:.2f} mean {result['mean_recall']:.2f}, "
+            f"same order {result['same_order_guilds']}/{result['guilds']}, "
+            f"bound violations {result['violations']}, missed heavy hitters {result['missing_heavy_hitters']}, "
+            f"busiest guild error {busiest['max_error']:,} ≤ N/k {busiest['bound']:,.0f}, "
+            f"{result['tokens_per_second']:,} tokens/s, top10 {result['top10_median_ms']:.3f}ms, {result['summary_kb']} KB"
+        )
+        report["results"].append(result)
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2)
+    print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
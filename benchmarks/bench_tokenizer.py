@@ -0,0 +1,119 @@
+"""
+Micro-benchmark: original tokenize_text vs the compiled tokenizer.
+
+Checks that both produce identical tokens on a synthetic corpus plus a set of
+edge cases, then reports messages/sec for each.
+
+    python benchmarks/bench_tokenizer.py [--messages 200000]
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from tokenizer import tokenize_many, tokenize_text  # noqa: E402
+
+
+def legacy_tokenize_text(text, stopwords=None):
+    # verbatim copy of the original main.tokenize_text, kept as the reference
+    text = re.sub(r"(https?://\S+|www\.\S+)", "", text)
+    text = re.sub(r"@[\w_]+", "", text)
+    text = re.sub(r"#\w+", "", text)
+    text = text.replace("’", "'")
+    raw_tokens = re.findall(r"\b[\w\*#@!$%]{2,}\b", text.lower())
+    raw_tokens = [token for token in raw_tokens if not (token.startswith(":") and token.endswith(":"))]
+    tokens = [token for token in raw_tokens if any(c.isalpha() for c in token)]
+    if stopwords:
+        tokens = [token for token in tokens if token not in stopwords]
+    return tokens
+
+
+EDGE_CASES = [
+    "",
+    "   ",
+    "Hello World",
+    "check https://example.com/a?b=c and www.foo.bar/baz ok",
+    "@bob hi #tag there",
+    "@abchttps://x.y/z tail",
+    "#www.hello world",
+    "@https://hello world",
+    "#http:// not a link",
+    "x@y!z a#b@c #@a @#b",
+    "it’s can't won’t",
+    ":smile: :+1: ::",
+    "42 1234 a1 _x_ __ 2nd",
+    "f*ck sh!t $$money$$ 100% @@ ##",
+    "İstanbul ǅemal ⅰⅱ ²x ΣΑΣ",
+    "日本語 テキスト 中文",
+    "HTTP://UPPER.case WWW.UPPER.case",
+    "emoji 😀😀 text",
+    "tab\tseparated\nnew line",
+]
+
+
+def load_words(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return [line.strip().lower() for line in f if line.strip()]
+    except FileNotFoundError:
+        return []
+
+
+def make_corpus(n, seed=1234):
+    rng = random.Random(seed)
+    vocab = load_words(os.path.join(ROOT, "stopwords.txt"))[:3000] or ["hello", "world"]
+    vocab += load_words(os.path.join(ROOT, "badwords_en.txt"))[:300]
+    extras = ["https://tenor.com/view/x-123", "@someone", "#general", "lol", "LMAO", "it’s", ":skull:", "123", "www.site.io"]
+    corpus = []
+    for _ in range(n):
+        words = rng.choices(vocab, k=rng.randint(1, 20))
+        if rng.random() < 0.15:
+            words.insert(rng.randrange(len(words) + 1), rng.choice(extras))
+        if rng.random() < 0.3:
+            words = [w.capitalize() for w in words]
+        corpus.append(" ".join(words))
+    return corpus
+
+
+def bench(label, fn, corpus, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(corpus)
+        best = min(best, time.perf_counter() - start)
+    rate = len(corpus) / best
+    print(f"{label:<32} {best:8.3f}s  {rate:12,.0f} msg/s")
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=200000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    stopwords = set(load_words(os.path.join(ROOT, "stopwords.txt")))
+    corpus = make_corpus(args.messages)
+
+    for text in EDGE_CASES + corpus:
+        for sw in (None, stopwords):
+            expected = legacy_tokenize_text(text, sw)
+            got = tokenize_text(text, sw)
+            if got != expected:
+                sys.exit(f"MISMATCH for {text!r}: expected {expected!r}, got {got!r}")
+    print(f"outputs identical on {len(EDGE_CASES) + len(corpus):,} messages")
+
+    before = bench("legacy tokenize_text", lambda c: [legacy_tokenize_text(t, stopwords) for t in c], corpus, args.repeat)
+    bench("compiled tokenize_text", lambda c: [tokenize_text(t, stopwords) for t in c], corpus, args.repeat)
+    after = bench("compiled tokenize_many", lambda c: list(tokenize_many(c, stopwords)), corpus, args.repeat)
+    print(f"speedup (tokenize_many vs legacy): {after / before:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Deterministic synthetic message corpus for benchmarks.
+
+Words are drawn from a Zipf distribution over a ranked vocabulary: stopwords.txt
+(already in frequency order) interleaved with badwords_en.txt and generated
+filler words that stand in for names, slang and typos. Guilds, authors within a
+guild, channels within a guild and message age (recent days busier) are Zipf
+distributed as well, so the tables get the long tails real servers have.
+
+Rows come out in message_id order as the 6-tuples main.store_messages() takes:
+(message_id, channel_id, author_id, content, timestamp, guild_id).
+"""
+
+import os
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DISCORD_EPOCH_MS = 1420070400000
+# 2026-01-01T00:00:00Z; the newest message is on the day before
+DEFAULT_END_MS = 1767225600000
+
+_SYLLABLES = ["ka", "zu", "mi", "ro", "te", "ba", "xi", "lo", "qua", "ne", "shi", "vo", "gr", "ul", "ped", "ix"]
+
+
+def parse_size(text):
+    """'10k' -> 10000, '1m' -> 1000000, '2500' -> 2500."""
+    text = text.strip().lower()
+    scale = {"k": 1000, "m": 1000000}.get(text[-1:], 1)
+    return int(float(text[:-1] if scale > 1 else text) * scale)
+
+
+def _read_words(path):
+    with open(path, "r", encoding="utf-8") as file:
+        return [line.strip().lower() for line in file if line.strip()]
+
+
+def zipf_probabilities(n, s):
+    weights = 1.0 / np.arange(1, n + 1) ** s
+    return weights / weights.sum()
+
+
+def build_vocabulary(seed=0, filler_words=20000, stopwords_path=None, badwords_path=None):
+    """
+    Ranked vocabulary: mostly stopwords near the top, like real text, with every
+    fourth rank a filler word and every twentieth a bad word.
+    """
+    rng = np.random.default_rng(seed)
+    stop = _read_words(stopwords_path or os.path.join(ROOT, "stopwords.txt"))
+    bad = _read_words(badwords_path or os.path.join(ROOT, "badwords_en.txt"))
+    rng.shuffle(bad)
+    filler = []
+    seen = set(stop) | set(bad)
+    while len(filler) < filler_words:
+        word = "".join(rng.choice(_SYLLABLES, rng.integers(2, 5)))
+        if word not in seen:
+            seen.add(word)
+            filler.append(word)
+    vocabulary = []
+    sources = [iter(stop), iter(filler), iter(bad)]
+    rank = 0
+    while True:
+        pick = 2 if rank % 20 == 19 else 1 if rank % 4 == 3 else 0
+        word = next(sources[pick], None)
+        if word is None:
+            # one list ran out; append the rest in order
+            for source in sources:
+                vocabulary.extend(source)
+            return vocabulary
+        vocabulary.append(word)
+        rank += 1
+
+
+class Corpus:
+    """
+    :param seed: everything generated is a function of the seed.
+    :param guilds, authors, channels_per_guild, days: population sizes.
+    :param words_per_message: mean words per message (Poisson; some messages are empty).
+    :param word_s, guild_s, author_s, channel_s, age_s: Zipf exponents.
+    """
+
+    def __init__(self, seed=0, guilds=20, authors=5000, channels_per_guild=25, days=730,
+                 words_per_message=8, word_s=1.05, guild_s=1.0, author_s=1.1, channel_s=1.0, age_s=0.6,
+                 end_ms=DEFAULT_END_MS, vocabulary=None):
+        self.seed = seed
+        self.vocabulary = np.array(vocabulary or build_vocabulary(seed), dtype=object)
+        # snowflakes a day apart, created in 2016
+        self.guild_ids = [(1451606400000 + g * 86400000 - DISCORD_EPOCH_MS) << 22 for g in range(guilds)]
+        self.authors = authors
+        self.channels_per_guild = channels_per_guild
+        self.days = days
+        self.words_per_message = words_per_message
+        self.end_ms = end_ms
+        self._word_p = zipf_probabilities(len(self.vocabulary), word_s)
+        self._guild_p = zipf_probabilities(guilds, guild_s)
+        self._author_p = zipf_probabilities(authors, author_s)
+        self._channel_p = zipf_probabilities(channels_per_guild, channel_s)
+        # index 0 is the oldest day; the newest day is the most active
+        self._day_p = zipf_probabilities(days, age_s)[::-1]
+
+    def batches(self, rows, batch_size=100000):
+        """Yield lists of up to batch_size rows, `rows` in total, oldest first."""
+        rng = np.random.default_rng(self.seed + 1)
+        day_counts = rng.multinomial(rows, self._day_p)
+        first_day_ms = (self.end_ms // 86400000 - self.days) * 86400000
+        pending = []
+        index = 0
+        for day, count in enumerate(day_counts):
+            if not count:
+                continue
+            ms = np.sort(first_day_ms + day * 86400000 + rng.integers(0, 86400000, count))
+            pending.extend(self._rows(rng, ms, index))
+            index += count
+            while len(pending) >= batch_size:
+                yield pending[:batch_size]
+                del pending[:batch_size]
+        if pending:
+            yield pending
+
+    def _rows(self, rng, ms, index):
+        n = len(ms)
+        guild_rank = rng.choice(len(self.guild_ids), n, p=self._guild_p)
+        author_rank = rng.choice(self.authors, n, p=self._author_p)
+        channel_rank = rng.choice(self.channels_per_guild, n, p=self._channel_p)
+        lengths = rng.poisson(self.words_per_message, n)
+        words = self.vocabulary[rng.choice(len(self.vocabulary), int(lengths.sum()), p=self._word_p)]
+        ends = np.cumsum(lengths)
+        timestamps = np.datetime_as_string(ms.astype("datetime64[ms]"), unit="us")
+        # low 22 bits make ids unique among messages sent in the same millisecond
+        ids = ((ms - DISCORD_EPOCH_MS) << 22) | ((np.arange(n) + index) & 0x3FFFFF)
+        rows = []
+        start = 0
+        for i in range(n):
+            end = ends[i]
+            guild = int(guild_rank[i])
+            # each guild has its own most active authors
+            author = 1000 + (int(author_rank[i]) + guild * 7919) % self.authors
+            channel = self.guild_ids[guild] + 1 + int(channel_rank[i])
+            rows.append((int(ids[i]), channel, author, " ".join(words[start:end]), timestamps[i] + "+00:00", self.guild_ids[guild]))
+            start = end
+        return rows
@@ -0,0 +1,115 @@
+"""
+Stand-ins for the bits of discord.py the crawlers and commands use.
+
+FakeChannel.history behaves like TextChannel.history (limit/before/after/
+oldest_first). Each call counts as one API request. It can simulate request
+latency and a per-channel rate-limit bucket, waiting the way discord.py's
+HTTP client would.
+"""
+
+import asyncio
+import datetime
+import time
+
+DISCORD_EPOCH_MS = 1420070400000
+
+
+def snowflake(ms, seq=0):
+    return ((ms - DISCORD_EPOCH_MS) << 22) + seq
+
+
+class FakeObject:
+    def __init__(self, **attrs):
+        self.__dict__.update(attrs)
+
+
+class FakeMessage:
+    def __init__(self, message_id, channel, author_id, content, bot=False):
+        self.id = message_id
+        self.channel = channel
+        self.guild = channel.guild
+        self.author = FakeObject(id=author_id, bot=bot, display_name=f"User {author_id}")
+        self.content = content
+        self.webhook_id = None
+        self.created_at = datetime.datetime.fromtimestamp(
+            ((message_id >> 22) + DISCORD_EPOCH_MS) / 1000, datetime.timezone.utc
+        )
+
+
+class _Bucket:
+    def __init__(self, requests, per):
+        self.requests = requests
+        self.per = per
+        self.sent = []
+
+    async def acquire(self):
+        now = time.monotonic()
+        self.sent = [t for t in self.sent if now - t < self.per]
+        if len(self.sent) >= self.requests:
+            await asyncio.sleep(self.per - (now - self.sent[0]))
+        self.sent.append(time.monotonic())
+
+
+class FakeChannel:
+    """
+    :param messages: FakeMessage list, or an int to generate that many messages.
+    :param latency: seconds each history request takes.
+    :param rate_limit: optional (requests, per_seconds) bucket for this channel's route.
+    """
+
+    def __init__(self, channel_id, guild, messages=0, latency=0.0, rate_limit=None, name=None):
+        self.id = channel_id
+        self.guild = guild
+        self.name = name or f"channel-{channel_id}"
+        self.latency = latency
+        self._bucket = _Bucket(*rate_limit) if rate_limit else None
+        self.requests = 0
+        if isinstance(messages, int):
+            start = (channel_id >> 22) + DISCORD_EPOCH_MS
+            messages = [
+                FakeMessage(snowflake(start + i * 1000, channel_id % 4096), self, 1 + i % 7, f"message number {i}")
+                for i in range(messages)
+            ]
+        self.messages = messages
+
+    @property
+    def last_message_id(self):
+        return self.messages[-1].id if self.messages else None
+
+    def permissions_for(self, member):
+        return FakeObject(read_message_history=True)
+
+    async def history(self, limit=100, before=None, after=None, around=None, oldest_first=None):
+        self.requests += 1
+        if self._bucket:
+            await self._bucket.acquire()
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        msgs = self.messages
+        if after is not None:
+            msgs = [m for m in msgs if m.id > after.id]
+        if before is not None:
+            msgs = [m for m in msgs if m.id < before.id]
+        if oldest_first is None:
+            oldest_first = after is not None
+        if oldest_first:
+            msgs = msgs[:limit] if limit is not None else msgs
+        else:
+            msgs = list(reversed(msgs))
+            msgs = msgs[:limit] if limit is not None else msgs
+        for m in msgs:
+            yield m
+
+
+class FakeGuild:
+    def __init__(self, guild_id, name="Fake Guild"):
+        self.id = guild_id
+        self.name = name
+        self.me = FakeObject(id=0)
+        self.text_channels = []
+
+    def get_channel(self, channel_id):
+        return next((c for c in self.text_channels if c.id == channel_id), None)
+
+    def get_member(self, member_id):
+        return FakeObject(id=member_id, display_name=f"User {member_id}")
@@ -0,0 +1,121 @@
+"""
+In-process LRU cache for command results and rendered graphs.
+
+Entries are keyed by (guild_id, key) and tagged with the guild's data
+generation at the time the result was computed. Ingestion calls ``bump`` for
+every guild it wrote to, so an entry computed from older data no longer
+matches and is never served; it is dropped when next looked up or evicted.
+
+    generation = cache.generation(guild_id)     # read before running the query
+    value = cache.get(guild_id, key)
+    if value is MISS:
+        value = compute()
+        cache.put(guild_id, key, value, generation)
+
+Memory is bounded by ``max_bytes``, measured with an estimate of each value's size.
+"""
+
+import sys
+from collections import OrderedDict
+
+MISS = object()
+
+
+def estimate_size(value):
+    """Rough size in bytes of a result made of tuples, lists, dicts, strings, bytes and numbers."""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(estimate_size(v) for v in value)
+    return size
+
+
+class ResultCache:
+    """
+    :param max_bytes: evict least recently used entries once their estimated size exceeds this.
+        Values bigger than a quarter of it are not cached at all.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # (guild_id, key) -> (generation, value, size)
+        self._generations = {}
+        self.bytes = 0
+        # counters
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+
+    def generation(self, guild_id):
+        return self._generations.get(guild_id, 0)
+
+    def bump(self, guild_ids):
+        """Mark every cached result for these guilds as out of date."""
+        for guild_id in set(guild_ids):
+            self._generations[guild_id] = self._generations.get(guild_id, 0) + 1
+
+    def get(self, guild_id, key):
+        """The cached value, or MISS."""
+        entry_key = (guild_id, key)
+        entry = self._entries.get(entry_key)
+        if entry is None:
+            self.misses += 1
+            return MISS
+        if entry[0] != self.generation(guild_id):
+            self._remove(entry_key)
+            self.stale += 1
+            self.misses += 1
+            return MISS
+        self._entries.move_to_end(entry_key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, guild_id, key, value, generation):
+        """Cache a value computed from the guild's data as of ``generation``."""
+        if generation != self.generation(guild_id):
+            # the data changed while the value was being computed
+            return
+        size = estimate_size(value)
+        if size > self.max_bytes // 4:
+            return
+        entry_key = (guild_id, key)
+        if entry_key in self._entries:
+            self._remove(entry_key)
+        self._entries[entry_key] = (generation, value, size)
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, entry_key):
+        self.bytes -= self._entries.pop(entry_key)[2]
+
+    def flush(self, guild_id=None):
+        """Drop every entry (or every entry of one guild). Returns how many were dropped."""
+        if guild_id is None:
+            dropped = len(self._entries)
+            self._entries.clear()
+            self.bytes = 0
+            return dropped
+        keys = [k for k in self._entries if k[0] == guild_id]
+        for k in keys:
+            self._remove(k)
+        return len(keys)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,195 @@
+"""
+Concurrent channel history crawler.
+
+Several channels are paged at once, bounded by ``concurrency``. Each page is
+one ``channel.history(limit=page_size, ...)`` call, i.e. one API request.
+Message history is rate limited per channel route, and discord.py's HTTP
+client already waits on each route's bucket. Crawling different channels at
+once therefore never contends for the same bucket. The optional
+``max_pages_per_second`` pacer keeps the crawl as a whole well under the
+global request limit, leaving headroom for the rest of the bot.
+
+Pages are grouped into batches and handed to a single writer coroutine. This
+keeps database writes serialized however many channels are being fetched.
+If writing one of a job's batches fails, that job stops. Its later batches are
+dropped, and it ends with an error batch that carries no resume point. So a
+checkpoint never moves past messages that were not stored.
+
+Anything with ``id`` and an async ``history(limit=, before=, after=,
+oldest_first=)`` method works as a channel, so the scheduler can be driven by
+fakes (see benchmarks/fakes.py).
+"""
+
+import asyncio
+import time
+
+import discord
+
+
+class CrawlJob:
+    """
+    :param channel: the channel to page through.
+    :param after: only fetch messages newer than this id (``None`` = from the beginning).
+    :param limit: stop after this many messages (``None`` = no limit).
+    :param newest_first: page backwards from the newest message instead (``after`` is ignored).
+
+    ``write_error`` is set once writing one of the job's batches failed.
+    """
+
+    def __init__(self, channel, after=None, limit=None, newest_first=False):
+        self.channel = channel
+        self.after = after
+        self.limit = limit
+        self.newest_first = newest_first
+        self.write_error = None
+
+
+class CrawlBatch:
+    """
+    A batch of messages from one job, as handed to the writer.
+
+    ``last_id`` is the id of the last message fetched (a resume point for oldest-first
+    jobs), ``newest_id`` the highest id seen so far. ``done`` is set on the final batch of
+    a job that finished, ``error`` on the final batch of a job that failed.
+    """
+
+    def __init__(self, job, messages, last_id, newest_id, done=False, error=None):
+        self.job = job
+        self.messages = messages
+        self.last_id = last_id
+        self.newest_id = newest_id
+        self.done = done
+        self.error = error
+
+
+class _Pacer:
+    # evenly spaced slots; cheap and good enough to cap the request rate
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class ChannelCrawler:
+    """
+    :param concurrency: how many channels are paged at the same time.
+    :param page_size: messages per history request (Discord caps this at 100).
+    :param batch_size: messages per batch handed to the writer.
+    :param max_pages_per_second: optional cap on history requests across all channels.
+    :param max_queued_batches: batches that may wait for the writer before fetching pauses.
+    """
+
+    def __init__(self, concurrency=4, page_size=100, batch_size=500, max_pages_per_second=None, max_queued_batches=8):
+        self.concurrency = max(1, concurrency)
+        self.page_size = page_size
+        self.batch_size = batch_size
+        self.max_pages_per_second = max_pages_per_second
+        self.max_queued_batches = max_queued_batches
+        # counters for the last run
+        self.pages = 0
+        self.messages = 0
+        self.errors = 0
+        self.elapsed = 0.0
+
+    @property
+    def messages_per_minute(self):
+        return self.messages / self.elapsed * 60 if self.elapsed else 0.0
+
+    async def run(self, jobs, write):
+        """
+        Crawl every job and await ``write(batch)`` for each CrawlBatch, one at a time.
+        Every job ends with exactly one batch that has ``done`` or ``error`` set. When
+        ``write`` raises, the job stops and that final batch is an error batch with no
+        messages and no ``last_id``/``newest_id``.
+        """
+        self.pages = self.messages = self.errors = 0
+        start = time.perf_counter()
+        queue = asyncio.Queue(self.max_queued_batches)
+        pacer = _Pacer(self.max_pages_per_second)
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def writer():
+            while True:
+                batch = await queue.get()
+                try:
+                    if batch is None:
+                        return
+                    job = batch.job
+                    if job.write_error is not None:
+                        # storing these would move the checkpoint past the lost batch
+                        continue
+                    try:
+                        await write(batch)
+                    except Exception as e:
+                        print(f"[ERROR] crawl writer failed for channel {job.channel.id}: {e}")
+                        self.errors += 1
+                        job.write_error = e
+                        try:
+                            await write(CrawlBatch(job, [], None, None, error=e))
+                        except Exception as e2:
+                            print(f"[ERROR] could not record the failure for channel {job.channel.id}: {e2}")
+                finally:
+                    queue.task_done()
+
+        async def worker(job):
+            async with semaphore:
+                await self._crawl_job(job, queue, pacer)
+
+        writer_task = asyncio.create_task(writer())
+        try:
+            await asyncio.gather(*(worker(job) for job in jobs))
+            await queue.put(None)
+            await writer_task
+        finally:
+            if not writer_task.done():
+                writer_task.cancel()
+            self.elapsed = time.perf_counter() - start
+
+    async def _crawl_job(self, job, queue, pacer):
+        channel = job.channel
+        cursor = None if job.newest_first else job.after
+        pending = []
+        last_id = None
+        newest_id = job.after
+        fetched = 0
+        try:
+            while job.limit is None or fetched < job.limit:
+                if job.write_error is not None:
+                    # the writer already ended this job
+                    return
+                want = self.page_size if job.limit is None else min(self.page_size, job.limit - fetched)
+                await pacer.wait()
+                if job.newest_first:
+                    before = discord.Object(id=cursor) if cursor else None
+                    page = [m async for m in channel.history(limit=want, before=before, oldest_first=False)]
+                else:
+                    after = discord.Object(id=cursor) if cursor else None
+                    page = [m async for m in channel.history(limit=want, after=after, oldest_first=True)]
+                self.pages += 1
+                if not page:
+                    break
+                fetched += len(page)
+                self.messages += len(page)
+                cursor = page[-1].id
+                last_id = page[-1].id
+                newest_id = max(newest_id or 0, max(m.id for m in page))
+                pending.extend(page)
+                if len(pending) >= self.batch_size:
+                    await queue.put(CrawlBatch(job, pending, last_id, newest_id))
+                    pending = []
+                if len(page) < want:
+                    break
+            await queue.put(CrawlBatch(job, pending, last_id, newest_id, done=True))
+        except Exception as e:
+            self.errors += 1
+            await queue.put(CrawlBatch(job, pending, last_id, newest_id, error=e))
@@ -0,0 +1,118 @@
+"""
+Async access to the SQLite database without blocking the event loop.
+
+All writes go through one dedicated writer thread, so ingestion is serialized
+on a single connection. Reads run on a small pool of reader threads, each with
+its own connection; WAL mode lets them proceed while the writer is busy.
+
+Work is submitted as plain functions taking a cursor as their first argument:
+
+    rows = await database.fetchall("SELECT ...", params)
+    added = await database.write(store_messages, rows)
+
+An optional ``on_query(op, name, wait_seconds, run_seconds)`` hook is called
+after every call with how long it queued for its thread and how long it ran
+(including the commit, for writes); ``name`` is the function's name, or the
+statement for ``fetchall``/``fetchone``/``execute``.
+"""
+
+import asyncio
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def _statement_name(sql, limit=60):
+    sql = " ".join(sql.split())
+    return sql if len(sql) <= limit else sql[:limit - 3] + "..."
+
+
+class Database:
+    """
+    :param path: path to the SQLite database file.
+    :param readers: number of reader threads (and connections).
+    :param on_query: optional timing hook, see the module docstring. Runs on the database threads.
+    """
+
+    def __init__(self, path, readers=2, on_query=None):
+        self.path = path
+        self.on_query = on_query
+        # calls submitted and not yet finished, counted on the event loop
+        self.pending = {"read": 0, "write": 0}
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer", initializer=self._connect)
+        self._readers = ThreadPoolExecutor(max_workers=readers, thread_name_prefix="db-reader", initializer=self._connect)
+
+    def _connect(self):
+        # each connection is only ever used by the thread that opened it;
+        # check_same_thread is off so close() can shut them all down
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL;")
+        conn.execute("PRAGMA busy_timeout=5000;")
+        self._local.conn = conn
+        with self._connections_lock:
+            self._connections.append(conn)
+
+    def _run_write(self, fn, args, name, submitted):
+        started = time.perf_counter()
+        conn = self._local.conn
+        cur = conn.cursor()
+        try:
+            result = fn(cur, *args)
+            conn.commit()
+            return result
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+            if self.on_query is not None:
+                self.on_query("write", name, started - submitted, time.perf_counter() - started)
+
+    def _run_read(self, fn, args, name, submitted):
+        started = time.perf_counter()
+        cur = self._local.conn.cursor()
+        try:
+            return fn(cur, *args)
+        finally:
+            cur.close()
+            if self.on_query is not None:
+                self.on_query("read", name, started - submitted, time.perf_counter() - started)
+
+    async def _submit(self, op, fn, args, name):
+        executor, run = (self._writer, self._run_write) if op == "write" else (self._readers, self._run_read)
+        loop = asyncio.get_running_loop()
+        self.pending[op] += 1
+        try:
+            return await loop.run_in_executor(executor, run, fn, args, name, time.perf_counter())
+        finally:
+            self.pending[op] -= 1
+
+    async def write(self, fn, *args):
+        """Run ``fn(cursor, *args)`` on the writer thread inside one transaction."""
+        return await self._submit("write", fn, args, fn.__name__)
+
+    async def read(self, fn, *args):
+        """Run ``fn(cursor, *args)`` on a reader thread."""
+        return await self._submit("read", fn, args, fn.__name__)
+
+    async def fetchall(self, sql, params=()):
+        return await self._submit("read", lambda cur: cur.execute(sql, params).fetchall(), (), _statement_name(sql))
+
+    async def fetchone(self, sql, params=()):
+        return await self._submit("read", lambda cur: cur.execute(sql, params).fetchone(), (), _statement_name(sql))
+
+    async def execute(self, sql, params=()):
+        """Run a single write statement and return its rowcount."""
+        return await self._submit("write", lambda cur: cur.execute(sql, params).rowcount, (), _statement_name(sql))
+
+    def close(self):
+        self._writer.shutdown(wait=True)
+        self._readers.shutdown(wait=True)
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
@@ -0,0 +1,152 @@
+"""
+Usage graphs rendered off the event loop.
+
+Drawing happens in a small pool of worker processes that import matplotlib
+once, select the Agg backend and warm the font cache before the first request
+arrives. Each graph is its own ``Figure`` (no pyplot global state), so workers
+never share a figure, and the PNG comes back as bytes.
+
+    renderer = GraphRenderer(workers=1, max_queue=8, timeout=20)
+    renderer.start()   # while the process still has a single thread
+    buf = await renderer.render({"2024-01-01": 3}, "title")   # BytesIO, or None if there is nothing to draw
+
+Workers are forked so they do not re-import the bot's main module, and a fork
+copies only the calling thread: any lock another thread held at that moment
+stays locked in the child forever. So the pool is started once, before the
+bot starts any threads, and never re-forked. If a worker dies the pool is
+shut down and rendering stays off until the bot restarts.
+
+``render`` raises ``GraphRendererBusy`` when ``max_queue`` graphs are already
+waiting for a worker, ``GraphRendererUnavailable`` when the pool was never
+started or has broken, and ``asyncio.TimeoutError`` when a graph takes longer
+than ``timeout`` seconds.
+"""
+
+import asyncio
+import functools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+
+
+class GraphRendererBusy(Exception):
+    pass
+
+
+class GraphRendererUnavailable(Exception):
+    pass
+
+
+def _warm_worker():
+    import matplotlib
+    matplotlib.use("Agg")
+    # first draw loads fonts and builds matplotlib's caches
+    render_usage_graph({"a": 0, "b": 1}, "warm-up")
+
+
+def render_usage_graph(data, title):
+    """PNG bytes of a line graph of {label: value}, labels in sorted order. Runs in a worker process."""
+    from matplotlib.figure import Figure
+
+    x = sorted(data)
+    y = [data[k] for k in x]
+    fig = Figure(figsize=(10, 4))
+    ax = fig.subplots()
+    ax.plot(x, y, marker='o')
+    ax.tick_params(axis='x', labelrotation=45)
+    ax.set_title(title)
+    fig.tight_layout()
+    buf = BytesIO()
+    fig.savefig(buf, format='png')
+    return buf.getvalue()
+
+
+class GraphRenderer:
+    """
+    :param workers: worker processes.
+    :param max_queue: graphs allowed to wait for a busy worker before ``render`` refuses more.
+    :param timeout: seconds ``render`` waits for a graph. The worker finishes it regardless.
+    """
+
+    def __init__(self, workers=1, max_queue=8, timeout=20.0):
+        self.workers = max(1, workers)
+        self.max_queue = max(0, max_queue)
+        self.timeout = timeout
+        self._pool = None
+        self.broken = False
+        self.in_flight = 0
+        # counters
+        self.rendered = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def _new_pool(self):
+        # forked workers start without re-importing the bot's main module
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context("fork") if "fork" in methods else None
+        pool = ProcessPoolExecutor(self.workers, mp_context=context, initializer=_warm_worker)
+        # processes start on the first submit; do it now so they are warm before the first command
+        pool.submit(int)
+        return pool
+
+    def start(self):
+        """Fork the workers. Call it before the process starts any other thread."""
+        if self._pool is None and not self.broken:
+            self._pool = self._new_pool()
+
+    @property
+    def available(self):
+        return self._pool is not None
+
+    def _break(self):
+        # a worker died (e.g. killed for memory); re-forking from a threaded process could deadlock
+        print("⚠️ A graph worker died; graphs are off until the bot restarts.")
+        self.broken = True
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self._pool = None
+
+    def _release(self):
+        self.in_flight -= 1
+
+    def _on_done(self, loop, _future):
+        # runs on the pool's management thread
+        try:
+            loop.call_soon_threadsafe(self._release)
+        except RuntimeError:
+            pass  # the event loop is already closed
+
+    async def render(self, data, title):
+        if not data:
+            return None
+        if self._pool is None:
+            raise GraphRendererUnavailable()
+        if self.in_flight >= self.workers + self.max_queue:
+            self.rejected += 1
+            raise GraphRendererBusy()
+        loop = asyncio.get_running_loop()
+        try:
+            future = self._pool.submit(render_usage_graph, data, title)
+        except BrokenProcessPool:
+            self._break()
+            raise GraphRendererUnavailable()
+        self.in_flight += 1
+        # released when the worker is really done, not when we stop waiting for it
+        future.add_done_callback(functools.partial(self._on_done, loop))
+        try:
+            png = await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except asyncio.TimeoutError:
+            # still queued graphs are dropped; one already drawing finishes in its worker
+            self.timed_out += 1
+            raise
+        except BrokenProcessPool:
+            if self._pool is not None:
+                self._break()
+            raise GraphRendererUnavailable()
+        self.rendered += 1
+        return BytesIO(png)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
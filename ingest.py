@@ -0,0 +1,122 @@
+"""
+Write-behind ingestion queue.
+
+Rows are buffered in memory and handed to a flush callback in batches, either
+once ``max_batch`` rows are pending or ``max_delay`` seconds after the first
+pending row arrived. ``put`` applies backpressure once ``max_pending`` rows are
+buffered, so memory stays bounded even if flushing falls behind.
+
+A flush writes at most ``max_batch`` rows per transaction, however many are
+pending, so a failed write loses one batch rather than the whole backlog.
+"""
+
+import asyncio
+import inspect
+import time
+
+
+class WriteBehindQueue:
+    """
+    :param flush: callable (or coroutine function) taking a list of rows and writing them in one transaction.
+    :param max_batch: flush as soon as this many rows are pending; also the most rows per transaction.
+    :param max_delay: flush at most this many seconds after a row was queued.
+    :param max_pending: ``put`` waits for a flush once this many rows are buffered.
+    """
+
+    def __init__(self, flush, max_batch=200, max_delay=0.5, max_pending=10000):
+        self._flush = flush
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_pending = max(max_pending, max_batch)
+        self._pending = []
+        self._wake = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task = None
+        # counters
+        self.rows_queued = 0
+        self.rows_flushed = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.rows_dropped = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self.total_flush_ms = 0.0
+
+    @property
+    def depth(self):
+        return len(self._pending)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def put(self, row):
+        self._pending.append(row)
+        self.rows_queued += 1
+        if len(self._pending) >= self.max_pending:
+            await self.flush()
+        elif len(self._pending) == 1 or len(self._pending) >= self.max_batch:
+            self._wake.set()
+
+    async def flush(self):
+        """Write everything pending right now, ``max_batch`` rows per transaction."""
+        async with self._lock:
+            while self._pending:
+                batch = self._pending[:self.max_batch]
+                del self._pending[:len(batch)]
+                start = time.perf_counter()
+                try:
+                    result = self._flush(batch)
+                    if inspect.isawaitable(result):
+                        await result
+                    self.rows_flushed += len(batch)
+                except Exception as e:
+                    self.failed_flushes += 1
+                    self.rows_dropped += len(batch)
+                    print(f"[ERROR] ingest flush of {len(batch)} rows failed: {e}")
+                elapsed = (time.perf_counter() - start) * 1000
+                self.flushes += 1
+                self.last_flush_ms = elapsed
+                self.max_flush_ms = max(self.max_flush_ms, elapsed)
+                self.total_flush_ms += elapsed
+
+    async def close(self):
+        """Stop the background task and flush whatever is still pending."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def stats(self):
+        return {
+            "depth": self.depth,
+            "rows_queued": self.rows_queued,
+            "rows_flushed": self.rows_flushed,
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+            "rows_dropped": self.rows_dropped,
+            "last_flush_ms": round(self.last_flush_ms, 3),
+            "max_flush_ms": round(self.max_flush_ms, 3),
+            "avg_flush_ms": round(self.total_flush_ms / self.flushes, 3) if self.flushes else 0.0,
+        }
+
+    async def _run(self):
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+            # give the batch up to max_delay to fill before writing it
+            if len(self._pending) < self.max_batch:
+                try:
+                    await asyncio.wait_for(self._wait_for_full_batch(), self.max_delay)
+                except asyncio.TimeoutError:
+                    pass
+            await self.flush()
+
+    async def _wait_for_full_batch(self):
+        while len(self._pending) < self.max_batch:
+            await self._wake.wait()
+            self._wake.clear()
@@ -0,0 +1,173 @@
+"""
+Word lists the analytics depend on: stopwords.txt and badwords_en.txt.
+
+Both are plain text, one word per line, compared lowercased. ``wordlist_hash``
+fingerprints a list so the database can tell when it changed.
+
+Stopwords are applied when reading, not when counting: the ``stopwords`` table
+holds the default list (guild_id 0, loaded from stopwords.txt) and each
+guild's own additions, and top-N queries anti-join against it. Editing either
+takes effect on the next query. Toxicity is the exception: a bad word that
+is also a default stopword never counts as toxic (``countable_toxic_words``).
+
+Parsed lists are kept in a compiled cache (marshal) in ``__pycache__`` next to
+the text file, together with their hash. The cache is used while the file's
+size and mtime match; if they changed but the content hash did not (e.g. the
+file was touched or checked out again), the cache is re-stamped instead of
+reparsed.
+"""
+
+import hashlib
+import marshal
+import os
+
+STOPWORDS_PATH = "stopwords.txt"
+TOXIC_WORDS_PATH = "badwords_en.txt"
+
+# bump when the cached tuple changes shape
+_CACHE_FORMAT = 1
+
+
+class Wordlist(frozenset):
+    """A loaded word list. ``digest`` is its ``wordlist_hash``, kept in the compiled cache."""
+
+    digest = None
+
+
+def _parse_wordlist(data):
+    return frozenset(
+        word for word in (line.strip().lower() for line in data.decode("utf-8").splitlines()) if word
+    )
+
+
+def _cache_path(path):
+    directory, name = os.path.split(os.path.abspath(path))
+    return os.path.join(directory, "__pycache__", f"{name}.lexicon")
+
+
+def _read_cache(cache_path):
+    try:
+        # marshal.load() on the file object reads in tiny chunks; loads() is much faster
+        with open(cache_path, "rb") as file:
+            entry = marshal.loads(file.read())
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    if not isinstance(entry, tuple) or len(entry) != 6 or entry[0] != _CACHE_FORMAT:
+        return None
+    return entry
+
+
+def _write_cache(cache_path, entry):
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        tmp = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as file:
+            file.write(marshal.dumps(entry))
+        os.replace(tmp, cache_path)
+    except OSError:
+        # a read-only checkout just means parsing every time
+        pass
+
+
+def _load_wordlist(path):
+    """The words in ``path`` as a Wordlist, from the compiled cache when it is current."""
+    stat = os.stat(path)
+    cache_path = _cache_path(path)
+    entry = _read_cache(cache_path)
+    if entry is not None and entry[1:3] == (stat.st_size, stat.st_mtime_ns):
+        words = Wordlist(entry[4])
+        words.digest = entry[5]
+        return words
+    with open(path, "rb") as file:
+        data = file.read()
+    content_hash = hashlib.sha1(data).hexdigest()
+    if entry is not None and entry[3] == content_hash:
+        words, digest = entry[4], entry[5]
+    else:
+        words = _parse_wordlist(data)
+        digest = wordlist_hash(words)
+    _write_cache(cache_path, (_CACHE_FORMAT, stat.st_size, stat.st_mtime_ns, content_hash, words, digest))
+    words = Wordlist(words)
+    words.digest = digest
+    return words
+
+
+def load_stopwords(path=STOPWORDS_PATH):
+    try:
+        return _load_wordlist(path)
+    except FileNotFoundError:
+        print(f"⚠️ {os.path.basename(path)} not found. No stopwords loaded.")
+        return Wordlist()
+
+
+def load_toxic_words(path=TOXIC_WORDS_PATH):
+    if not os.path.exists(path):
+        return Wordlist()
+    return _load_wordlist(path)
+
+
+def countable_toxic_words(toxic_words, stopwords):
+    """
+    The bad words counted toward toxicity: those not also in the default stopwords
+    (e.g. "abuse", "naked"). The digest covers both lists, so editing either one
+    makes the toxicity tables stale.
+    """
+    words = Wordlist(toxic_words - stopwords)
+    words.digest = hashlib.sha1(
+        f"{wordlist_hash(toxic_words)} - {wordlist_hash(stopwords)}".encode("utf-8")
+    ).hexdigest()
+    return words
+
+
+# --- stopwords table ---
+
+DEFAULT_STOPWORDS_GUILD = 0
+
+STOPWORDS_TABLE_SQL = '''
+CREATE TABLE IF NOT EXISTS stopwords (
+    guild_id INTEGER NOT NULL,
+    word TEXT NOT NULL,
+    PRIMARY KEY (guild_id, word)
+) WITHOUT ROWID
+'''
+
+
+def create_stopwords_table(cur):
+    cur.execute(STOPWORDS_TABLE_SQL)
+
+
+def replace_default_stopwords(cur, words):
+    """Make the default list exactly ``words``. Caller commits."""
+    cur.execute("DELETE FROM stopwords WHERE guild_id = ?", (DEFAULT_STOPWORDS_GUILD,))
+    cur.executemany(
+        "INSERT OR IGNORE INTO stopwords (guild_id, word) VALUES (?, ?)",
+        ((DEFAULT_STOPWORDS_GUILD, word) for word in words)
+    )
+
+
+def add_guild_stopwords(cur, guild_id, words):
+    """Add words to a guild's own list. Returns how many were new."""
+    before = cur.connection.total_changes
+    cur.executemany("INSERT OR IGNORE INTO stopwords (guild_id, word) VALUES (?, ?)", ((guild_id, w) for w in words))
+    return cur.connection.total_changes - before
+
+
+def remove_guild_stopwords(cur, guild_id, words):
+    """Remove words from a guild's own list (not from the default list). Returns how many were removed."""
+    before = cur.connection.total_changes
+    cur.executemany("DELETE FROM stopwords WHERE guild_id = ? AND word = ?", ((guild_id, w) for w in words))
+    return cur.connection.total_changes - before
+
+
+def guild_stopwords(cur, guild_id):
+    """(the guild's own stopwords sorted, number of default stopwords)."""
+    own = [w for (w,) in cur.execute("SELECT word FROM stopwords WHERE guild_id = ? ORDER BY word", (guild_id,))]
+    (defaults,) = cur.execute("SELECT COUNT(*) FROM stopwords WHERE guild_id = ?", (DEFAULT_STOPWORDS_GUILD,)).fetchone()
+    return own, defaults
+
+
+def wordlist_hash(words):
+    digest = getattr(words, "digest", None)
+    if digest is not None:
+        return digest
+    return hashlib.sha1("\n".join(sorted(words)).encode("utf-8")).hexdigest()
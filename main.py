@@ -1,3 +1,6 @@
+import time
+# Startup is timed from here (before the heavy imports) to the first on_ready
+STARTUP_STARTED = time.perf_counter()
 import discord
 from discord.ext import commands, tasks
 import sqlite3
@@ -5,78 +8,457 @@ from dotenv import load_dotenv
 import os
 import json
 import random
-import aiohttp
 import datetime
+import math
 import string
 from collections import Counter
 from io import BytesIO
-import matplotlib.pyplot as plt
-import re
 from discord import app_commands
-import uwuipy
 import asyncio
+from ingest import WriteBehindQueue
+from database import Database
+from crawler import ChannelCrawler, CrawlJob
+from aggregates import (
+    AGGREGATE_TABLES, AGGREGATES_VERSION, DISCORD_EPOCH_MS, REBUILD_CHUNK_SIZE,
+    AggregateCounts, create_aggregate_tables,
+)
+from lexicon import (
+    add_guild_stopwords, countable_toxic_words, create_stopwords_table, guild_stopwords, load_stopwords, load_toxic_words,
+    remove_guild_stopwords, replace_default_stopwords, wordlist_hash,
+)
+import analytics
+from metrics import LAG_BUCKETS, Metrics, serve as serve_metrics, write_textfile
+from graphs import GraphRenderer, GraphRendererBusy, GraphRendererUnavailable
+from cache import MISS, ResultCache
+from sketch import GuildSketches
+
+# (phase, perf_counter when it finished), reported once the bot is ready
+startup_marks = [("start", STARTUP_STARTED)]
+startup_seconds = None
+
+def mark_startup(phase):
+    startup_marks.append((phase, time.perf_counter()))
+
+def startup_report():
+    return ", ".join(
+        f"{phase} {format_seconds(end - start)}" for (_, start), (phase, end) in zip(startup_marks, startup_marks[1:])
+    )
+
+mark_startup("imports")
+
+def _env_number(name, default, cast=int):
+    raw = os.getenv(name, "").strip()
+    try:
+        return cast(raw) if raw else default
+    except ValueError:
+        return default
 
-# --- Database setup (with migration for guild_id) ---
-db = sqlite3.connect("wordcount.db", check_same_thread=False)
+# --- Database setup (with versioned migrations) ---
+DB_PATH = "wordcount.db"
+db = sqlite3.connect(DB_PATH)
 cursor = db.cursor()
-cursor.execute('''
-CREATE TABLE IF NOT EXISTS messages (
-    message_id INTEGER PRIMARY KEY,
-    channel_id INTEGER,
-    author_id INTEGER,
-    content TEXT,
-    timestamp TEXT
-)
-''')
-db.commit()
 
-cursor.execute("PRAGMA journal_mode=WAL;")
+def get_meta(cur, key, default=None):
+    row = cur.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else default
+
+def set_meta(cur, key, value):
+    cur.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+# Schema versions, recorded in meta.schema_version:
+#   1 - messages.guild_id
+#   2 - covering indexes for per-guild author and channel scans
+#   3 - messages_fts full-text index (FTS5) kept in sync by triggers
+#   4 - aggregate, sync and crawl tables created here once instead of on every start
+#   5 - stopwords table; stopwords are filtered when reading instead of when counting
+SCHEMA_VERSION = 5
+
+# An up-to-date database is recognised by its schema_version row alone; none of
+# the DDL below runs unless something is missing.
+try:
+    schema_version = int(get_meta(cursor, "schema_version", "0"))
+except sqlite3.OperationalError:
+    # new database, no meta table yet
+    schema_version = 0
+
+if schema_version < SCHEMA_VERSION:
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS messages (
+        message_id INTEGER PRIMARY KEY,
+        channel_id INTEGER,
+        author_id INTEGER,
+        content TEXT,
+        timestamp TEXT
+    )
+    ''')
+    cursor.execute("PRAGMA journal_mode=WAL;")
+    cursor.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+    db.commit()
+
+cols = [r[1] for r in cursor.execute("PRAGMA table_info(messages)").fetchall()] if schema_version < 2 else []
 
 # Ensure schema has guild_id column (safe migration)
-cursor.execute("PRAGMA table_info(messages)")
-cols = [r[1] for r in cursor.fetchall()]
-if "guild_id" not in cols:
+if schema_version < 1:
     try:
-        cursor.execute("ALTER TABLE messages ADD COLUMN guild_id INTEGER")
+        if "guild_id" not in cols:
+            cursor.execute("ALTER TABLE messages ADD COLUMN guild_id INTEGER")
+            print("✅ Migrated messages table: added guild_id column.")
+        set_meta(cursor, "schema_version", 1)
         db.commit()
-        print("✅ Migrated messages table: added guild_id column.")
+        schema_version = 1
     except Exception as e:
         print(f"⚠️ Could not add guild_id column: {e}")
 
-# --- Helpers and config loading ---
-
-def load_stopwords(path="stopwords.txt"):
+# Covering indexes. Time ranges need no column or index of their own: message_id
+# is a snowflake (creation time in its high bits) and the table's primary key.
+if schema_version == 1:
     try:
-        with open(path, "r", encoding="utf-8") as file:
-            return {line.strip().lower() for line in file if line.strip()}
-    except FileNotFoundError:
-        print("⚠️ stopwords.txt not found. No stopwords loaded.")
-        return set()
-
-stopwords = load_stopwords()
-
-def tokenize_text(text, stopwords=None):
-    # remove links, mentions and hashtags first
-    text = re.sub(r"(https?://\S+|www\.\S+)", "", text)
-    text = re.sub(r"@[\w_]+", "", text)
-    text = re.sub(r"#\w+", "", text)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_messages_guild_author ON messages (guild_id, author_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_messages_guild_channel ON messages (guild_id, channel_id)")
+        set_meta(cursor, "schema_version", 2)
+        db.commit()
+        schema_version = 2
+        print("✅ Migrated messages table to schema v2: added indexes.")
+    except Exception as e:
+        db.rollback()
+        print(f"⚠️ Could not migrate messages table to schema v2: {e}")
+
+# Full-text index over messages.content for phrase and NEAR queries. It is an
+# external-content table (rowid = message_id), so the text is not stored twice;
+# the triggers keep it in step with every insert, delete and content edit.
+# Messages already stored are indexed afterwards by the fts_backfill task, so a
+# big history does not hold up startup.
+if schema_version == 2:
+    try:
+        cursor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5("
+            "content, content='messages', content_rowid='message_id')"
+        )
+        cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+            INSERT INTO messages_fts (rowid, content) VALUES (new.message_id, new.content);
+        END
+        ''')
+        cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+            INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.message_id, old.content);
+        END
+        ''')
+        cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF content ON messages BEGIN
+            INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.message_id, old.content);
+            INSERT INTO messages_fts (rowid, content) VALUES (new.message_id, new.content);
+        END
+        ''')
+        (newest_id,) = cursor.execute("SELECT MAX(message_id) FROM messages").fetchone()
+        if newest_id is not None:
+            set_meta(cursor, "fts_backfill_after", 0)
+            set_meta(cursor, "fts_backfill_until", newest_id)
+        set_meta(cursor, "schema_version", 3)
+        db.commit()
+        schema_version = 3
+        print("✅ Migrated messages table to schema v3: added full-text index"
+              + (" (cached messages are indexed in the background)." if newest_id is not None else "."))
+    except Exception as e:
+        db.rollback()
+        print(f"⚠️ Could not build the full-text index (phrase search disabled): {e}")
+
+FTS_ENABLED = schema_version >= 3
+
+# Messages up to fts_backfill_until predate the index; those after fts_backfill_after are not in it yet
+fts_backfill_after = int(get_meta(cursor, "fts_backfill_after", "0")) if FTS_ENABLED else 0
+fts_backfill_until = int(get_meta(cursor, "fts_backfill_until", "0")) if FTS_ENABLED else 0
+
+# Without FTS5 the database stays at v2 and this block simply runs on every start.
+if schema_version < 4:
+    # Derived word aggregates (see aggregates.py), kept up to date by store_messages()
+    # so commands never have to re-tokenize history.
+    create_aggregate_tables(cursor)
+
+    # channel_sync_state: newest message id background_cache has seen per channel
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS channel_sync_state (
+        channel_id INTEGER PRIMARY KEY,
+        guild_id INTEGER NOT NULL,
+        last_message_id INTEGER NOT NULL
+    )
+    ''')
+    # crawl_progress: per-channel checkpoint of the initcache deep crawl.
+    # target_message_id is the channel's newest message when the crawl started; run_started_at and
+    # run_start_message_id are when the latest run began and how far the channel had got by then,
+    # so the ETA ignores time the crawl spent stopped.
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS crawl_progress (
+        channel_id INTEGER PRIMARY KEY,
+        guild_id INTEGER NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        last_message_id INTEGER,
+        target_message_id INTEGER,
+        messages_cached INTEGER NOT NULL DEFAULT 0,
+        started_at REAL,
+        updated_at REAL,
+        error TEXT,
+        run_started_at REAL,
+        run_start_message_id INTEGER
+    )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_crawl_progress_guild ON crawl_progress (guild_id)")
+    if schema_version == 3:
+        set_meta(cursor, "schema_version", 4)
+        schema_version = 4
+    db.commit()
 
-    # normalize apostrophes
-    text = text.replace("’", "'")
+if schema_version < 5:
+    create_stopwords_table(cursor)
+    # it fingerprinted the stopwords baked into the old aggregates, which are recounted below
+    cursor.execute("DELETE FROM meta WHERE key = 'stopwords_hash'")
+    if schema_version == 4:
+        set_meta(cursor, "schema_version", 5)
+        schema_version = 5
+    db.commit()
 
-    # extract tokens (at least 2 chars) and allow some punctuation chars intentionally
-    raw_tokens = re.findall(r"\b[\w\*#@!$%]{2,}\b", text.lower())
+mark_startup("schema")
 
-    # remove emoji shortcodes like :smile:
-    raw_tokens = [token for token in raw_tokens if not (token.startswith(":") and token.endswith(":"))]
+# --- Helpers and config loading ---
 
-    # keep tokens that contain a letter (not just numbers or symbols)
-    tokens = [token for token in raw_tokens if any(c.isalpha() for c in token)]
+# Both come from a compiled cache unless the text files changed (see lexicon.py)
+stopwords = load_stopwords()
+TOXIC_WORDS = countable_toxic_words(load_toxic_words(), stopwords)
+mark_startup("lexicons")
+
+# --- Message storage and word index maintenance ---
+INSERT_MESSAGE_SQL = "INSERT OR IGNORE INTO messages (message_id, channel_id, author_id, content, timestamp, guild_id) VALUES (?, ?, ?, ?, ?, ?)"
+# Changes to badwords_en.txt (or to which bad words are stopwords) only need the toxicity tables rebuilt
+TOXIC_WORDS_HASH = wordlist_hash(TOXIC_WORDS)
+# Stopword changes only reload the default rows of the stopwords table
+STOPWORDS_HASH = wordlist_hash(stopwords)
+
+def message_row(message, guild_id=None):
+    """Build a messages-table row tuple from a discord.Message."""
+    return (
+        message.id,
+        message.channel.id,
+        message.author.id,
+        message.content or "",
+        message.created_at.isoformat(),
+        guild_id if guild_id is not None else message.guild.id
+    )
+
+def index_messages(cur, rows):
+    """
+    Fold message rows into the word aggregates.
+    rows are (message_id, channel_id, author_id, content, timestamp, guild_id) tuples
+    that have just been stored; rows without a guild_id are skipped.
+    """
+    AggregateCounts().add(rows, TOXIC_WORDS).write(cur)
 
-    if stopwords:
-        tokens = [token for token in tokens if token not in stopwords]
+def _encodable_row(row):
+    # content with unencodable characters (e.g. lone surrogates) cannot be bound by sqlite3
+    try:
+        row[3].encode("utf-8")
+        return row
+    except UnicodeEncodeError:
+        return row[:3] + (row[3].encode("utf-8", errors="replace").decode("utf-8"),) + row[4:]
+
+def cached_message_ids(cur, message_ids):
+    """The subset of message_ids that are already stored."""
+    found = set()
+    ids = list(message_ids)
+    for i in range(0, len(ids), 500):
+        chunk = ids[i:i + 500]
+        cur.execute(f"SELECT message_id FROM messages WHERE message_id IN ({','.join('?' * len(chunk))})", chunk)
+        found.update(mid for (mid,) in cur.fetchall())
+    return found
+
+def store_new_messages(cur, rows):
+    """
+    Insert message rows and index the ones that were not already stored.
+    Returns the rows that were new. Meant to run through database.write().
+    """
+    candidates = {}
+    for row in rows:
+        candidates.setdefault(row[0], row)
+    for mid in cached_message_ids(cur, candidates):
+        del candidates[mid]
+    new_rows = [_encodable_row(row) for row in candidates.values()]
+    if new_rows:
+        cur.executemany(INSERT_MESSAGE_SQL, new_rows)
+        index_messages(cur, new_rows)
+    return new_rows
+
+def store_messages(cur, rows):
+    """store_new_messages(), returning how many rows were new."""
+    return len(store_new_messages(cur, rows))
+
+def rebuild_aggregates(cur):
+    """Recompute every word aggregate from scratch out of the messages table. Caller commits."""
+    for table in AGGREGATE_TABLES:
+        cur.execute(f"DELETE FROM {table}")
+    reader = cur.connection.cursor()
+    reader.execute("SELECT message_id, channel_id, author_id, content, timestamp, guild_id FROM messages WHERE guild_id IS NOT NULL")
+    while True:
+        rows = reader.fetchmany(REBUILD_CHUNK_SIZE)
+        if not rows:
+            break
+        index_messages(cur, rows)
+    set_meta(cur, "aggregates_version", AGGREGATES_VERSION)
+    set_meta(cur, "toxic_words_hash", TOXIC_WORDS_HASH)
+
+def rebuild_toxicity(cur):
+    """Recompute the toxicity tables from word_index after TOXIC_WORDS changed. Caller commits."""
+    cur.execute("DELETE FROM toxic_word_counts")
+    cur.execute("DELETE FROM toxicity_counts")
+    cur.execute("CREATE TEMP TABLE IF NOT EXISTS toxic_lexicon (word TEXT PRIMARY KEY)")
+    cur.execute("DELETE FROM toxic_lexicon")
+    cur.executemany("INSERT OR IGNORE INTO toxic_lexicon (word) VALUES (?)", ((w,) for w in TOXIC_WORDS))
+    cur.execute(
+        "INSERT INTO toxic_word_counts (guild_id, author_id, word, count) "
+        "SELECT w.guild_id, w.author_id, w.word, w.count FROM word_index w JOIN toxic_lexicon t ON t.word = w.word"
+    )
+    cur.execute(
+        "INSERT INTO toxicity_counts (guild_id, author_id, count) "
+        "SELECT guild_id, author_id, SUM(count) FROM toxic_word_counts GROUP BY guild_id, author_id"
+    )
+    cur.execute("DROP TABLE toxic_lexicon")
+    set_meta(cur, "toxic_words_hash", TOXIC_WORDS_HASH)
+
+# Recounting happens here only for small databases; bigger ones are recounted by the
+# parallel rebuild.py (bot stopped) instead of blocking startup for a long time.
+STARTUP_REBUILD_MAX_MESSAGES = _env_number("STARTUP_REBUILD_MAX_MESSAGES", 20000)
+
+# (Re)build the aggregates for databases created before they existed or counted differently
+aggregates_version = get_meta(cursor, "aggregates_version")
+if aggregates_version != AGGREGATES_VERSION:
+    (stored,) = cursor.execute(
+        "SELECT COUNT(*) FROM (SELECT 1 FROM messages LIMIT ?)", (STARTUP_REBUILD_MAX_MESSAGES + 1,)
+    ).fetchone()
+    if stored > STARTUP_REBUILD_MAX_MESSAGES:
+        db.close()
+        raise SystemExit(
+            f"❌ The word aggregates in {DB_PATH} are out of date (version {aggregates_version or 'none'}, "
+            f"need {AGGREGATES_VERSION}). Run `python rebuild.py --db {DB_PATH}` with the bot stopped, then start it again."
+        )
+    print("🔧 Building word aggregates from cached messages...")
+    rebuild_aggregates(cursor)
+    db.commit()
+    print("✅ Word aggregates built.")
+else:
+    if get_meta(cursor, "toxic_words_hash") != TOXIC_WORDS_HASH:
+        print("🔧 The toxic word list changed, rebuilding toxicity counts...")
+        rebuild_toxicity(cursor)
+        db.commit()
+        print("✅ Toxicity counts rebuilt.")
 
-    return tokens
+# The default stopword rows follow stopwords.txt; counts do not depend on them
+if get_meta(cursor, "default_stopwords_hash") != STOPWORDS_HASH:
+    replace_default_stopwords(cursor, stopwords)
+    set_meta(cursor, "default_stopwords_hash", STOPWORDS_HASH)
+    db.commit()
+    print(f"✅ Loaded {len(stopwords)} default stopwords from stopwords.txt.")
+mark_startup("aggregate checks")
+
+# --- Metrics ---
+# METRICS=0 turns recording off. METRICS_FILE writes the Prometheus text format to a file
+# every METRICS_FILE_INTERVAL seconds; METRICS_PORT serves it on http://127.0.0.1:<port>/metrics
+metrics = Metrics(enabled=os.getenv("METRICS", "1").strip().lower() not in ("0", "false", "off", "no"))
+metrics.histogram("command_latency_seconds", "Time from command invocation to completion, by command and outcome.")
+metrics.histogram("db_query_seconds", "Time a database call ran on its thread, including the commit for writes.")
+metrics.histogram("db_wait_seconds", "Time a database call waited for a free database thread.")
+metrics.histogram("ingest_lag_seconds", "Time from a message being sent to its row being committed, by ingestion path.", LAG_BUCKETS)
+METRICS_FILE = os.getenv("METRICS_FILE", "").strip() or None
+METRICS_PORT = _env_number("METRICS_PORT", 0)
+
+def record_query(op, name, wait, elapsed):
+    metrics.observe("db_query_seconds", elapsed, op=op, query=name)
+    metrics.observe("db_wait_seconds", wait, op=op)
+
+def record_ingest_lag(source, rows):
+    """Observe the sent-to-committed lag of freshly committed message rows."""
+    if not metrics.enabled or not rows:
+        return
+    now_ms = time.time() * 1000
+    metrics.observe_many(
+        "ingest_lag_seconds",
+        [(now_ms - ((row[0] >> 22) + DISCORD_EPOCH_MS)) / 1000 for row in rows],
+        source=source,
+    )
+
+# Startup migrations are done; from here on every query runs on the database worker threads
+db.close()
+database = Database(DB_PATH, readers=_env_number("DB_READERS", 2), on_query=record_query if metrics.enabled else None)
+metrics.gauge("db_pending_calls", "Database calls submitted and not yet finished.", lambda: database.pending["read"], op="read")
+metrics.gauge("db_pending_calls", "Database calls submitted and not yet finished.", lambda: database.pending["write"], op="write")
+
+# Command results and rendered graphs, per guild, until that guild's data changes (RESULT_CACHE_MB=0 turns it off)
+result_cache = ResultCache(max_bytes=int(_env_number("RESULT_CACHE_MB", 64, float) * 1024 * 1024))
+metrics.gauge("result_cache_bytes", "Estimated size of cached command results.", lambda: result_cache.bytes)
+metrics.gauge("result_cache_entries", "Cached command results.", lambda: len(result_cache))
+for _outcome in ("hits", "misses", "evictions"):
+    metrics.gauge(f"result_cache_{_outcome}_total", f"Result cache {_outcome}.", lambda o=_outcome: getattr(result_cache, o), kind="counter")
+
+def data_changed(rows):
+    """
+    Invalidate cached results for the guilds of freshly committed message rows and add them
+    to the live sketches. Every ingestion path calls this with the rows that were new.
+    """
+    result_cache.bump(row[5] for row in rows if row[5] is not None)
+    if live_sketches is not None:
+        live_sketches.add_rows(rows)
+
+async def cached_read(guild_id, key, fn, *args):
+    """``database.read(fn, guild_id, *args)``, answered from the result cache while the guild's data is unchanged."""
+    value = result_cache.get(guild_id, key)
+    if value is MISS:
+        generation = result_cache.generation(guild_id)
+        value = await database.read(fn, guild_id, *args)
+        result_cache.put(guild_id, key, value, generation)
+    return value
+
+# --- Live top words ---
+# SKETCH_GUILDS ("all" or comma-separated guild ids) keeps a fixed-size Space-Saving summary per guild,
+# fed by every newly stored message, for `top10 live`. Counts are at most N / SKETCH_CAPACITY too high (N = words seen).
+_sketch_guilds = os.getenv("SKETCH_GUILDS", "").strip().lower()
+live_sketches = None
+if _sketch_guilds:
+    live_sketches = GuildSketches(
+        capacity=max(16, _env_number("SKETCH_CAPACITY", 2048)),
+        guild_ids=None if _sketch_guilds == "all" else {int(g) for g in _sketch_guilds.split(",") if g.strip().isdigit()},
+    )
+SKETCH_PATH = os.getenv("SKETCH_PATH", "sketches.json")
+# most rows per guild read back from the database after a restart to catch a snapshot up
+SKETCH_CATCHUP_ROWS = _env_number("SKETCH_CATCHUP_ROWS", 200000)
+# guild_id -> that guild's own stopwords, for `top10 live` (the defaults are in `stopwords`)
+live_stopwords = {}
+
+def messages_after(cur, guild_id, after_id, limit):
+    return cur.execute(
+        "SELECT message_id, channel_id, author_id, content, timestamp, guild_id FROM messages "
+        "WHERE guild_id = ? AND message_id > ? ORDER BY message_id LIMIT ?",
+        (guild_id, after_id, limit)
+    ).fetchall()
+
+async def load_live_sketches():
+    """Load the last snapshot and add what was stored since, before live ingestion starts."""
+    if not os.path.exists(SKETCH_PATH):
+        return
+    try:
+        loaded = live_sketches.load(SKETCH_PATH)
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        print(f"⚠️ Could not load live sketches from {SKETCH_PATH}, starting empty: {e}")
+        return
+    caught_up = 0
+    for guild_id, last_id in list(live_sketches.last_message_ids.items()):
+        # past the limit the rest of the downtime is simply not in the summary
+        added = 0
+        while added < SKETCH_CATCHUP_ROWS:
+            rows = await database.read(messages_after, guild_id, last_id, min(5000, SKETCH_CATCHUP_ROWS - added))
+            if not rows:
+                break
+            live_sketches.add_rows(rows)
+            added += len(rows)
+            last_id = rows[-1][0]
+        caught_up += added
+    print(f"🧮 Loaded live sketches for {loaded} guild(s), caught up on {caught_up:,} stored message(s).")
 
 intents = discord.Intents.default()
 intents.messages = True
@@ -87,7 +469,16 @@ intents.members = True
 kill_switch_engaged = False
 auto_purify_enabled = False
 stalked_user_ids = set()
-uwu = uwuipy.Uwuipy()
+# uwuipy is only loaded once someone is actually uwulocked
+uwu = None
+
+def get_uwu():
+    global uwu
+    if uwu is None:
+        import uwuipy
+        uwu = uwuipy.Uwuipy()
+    return uwu
+
 uwulocked_user_ids = set()
 webhook_cache = {}
 load_dotenv()
@@ -104,7 +495,104 @@ def get_guild_state(container, guild_id):
         return container.setdefault(guild_id, set())
     return container
 
-bot = commands.Bot(command_prefix="s ", intents=intents)
+# Live messages are written behind in batches instead of one commit per message
+async def flush_ingest_batch(rows):
+    data_changed(await database.write(store_new_messages, rows))
+    record_ingest_lag("on_message", rows)
+
+ingest_queue = WriteBehindQueue(
+    flush_ingest_batch,
+    max_batch=_env_number("INGEST_BATCH_SIZE", 200),
+    max_delay=_env_number("INGEST_FLUSH_MS", 500) / 1000,
+    max_pending=_env_number("INGEST_MAX_PENDING", 10000),
+)
+metrics.gauge("ingest_queue_depth", "Live messages buffered and not yet written.", lambda: ingest_queue.depth)
+metrics.gauge("ingest_rows_flushed_total", "Live messages written by the ingestion queue.", lambda: ingest_queue.rows_flushed, kind="counter")
+metrics.gauge("ingest_failed_flushes_total", "Ingestion queue flushes that failed.", lambda: ingest_queue.failed_flushes, kind="counter")
+metrics.gauge("ingest_rows_dropped_total", "Live messages lost because their flush failed.", lambda: ingest_queue.rows_dropped, kind="counter")
+
+class WordCountBot(commands.Bot):
+    metrics_runner = None
+
+    async def setup_hook(self):
+        mark_startup("login")
+        if live_sketches is not None:
+            await load_live_sketches()
+            save_live_sketches.start()
+        ingest_queue.start()
+        if fts_backfill_after < fts_backfill_until:
+            print("🔧 Indexing older messages for phrase search in the background...")
+            fts_backfill.start()
+        if METRICS_PORT:
+            try:
+                self.metrics_runner = await serve_metrics(metrics, METRICS_PORT)
+                print(f"📈 Serving metrics on http://127.0.0.1:{METRICS_PORT}/metrics")
+            except OSError as e:
+                print(f"⚠️ Could not serve metrics on port {METRICS_PORT}: {e}")
+        if METRICS_FILE:
+            export_metrics_file.start()
+
+    async def close(self):
+        # make sure buffered messages reach the database before shutting down
+        await ingest_queue.close()
+        if live_sketches is not None:
+            if save_live_sketches.is_running():
+                save_live_sketches.cancel()
+            try:
+                live_sketches.save(SKETCH_PATH)
+            except OSError as e:
+                print(f"⚠️ Could not save live sketches to {SKETCH_PATH}: {e}")
+        if export_metrics_file.is_running():
+            export_metrics_file.cancel()
+        if fts_backfill.is_running():
+            fts_backfill.cancel()
+        if self.metrics_runner is not None:
+            await self.metrics_runner.cleanup()
+        await super().close()
+        graph_renderer.close()
+        database.close()
+
+bot = WordCountBot(command_prefix="s ", intents=intents)
+
+@tasks.loop(minutes=_env_number("SKETCH_SNAPSHOT_MINUTES", 5, float))
+async def save_live_sketches():
+    # copied on the loop, written out on a thread
+    snapshot = live_sketches.snapshot()
+    try:
+        await asyncio.to_thread(GuildSketches.write, SKETCH_PATH, snapshot)
+    except OSError as e:
+        print(f"⚠️ Could not save live sketches to {SKETCH_PATH}: {e}")
+
+@tasks.loop(seconds=_env_number("METRICS_FILE_INTERVAL", 15, float))
+async def export_metrics_file():
+    try:
+        write_textfile(metrics, METRICS_FILE)
+    except OSError as e:
+        print(f"⚠️ Could not write metrics to {METRICS_FILE}: {e}")
+
+def _record_command(ctx):
+    started = getattr(ctx, "metrics_started", None)
+    if started is None or ctx.command is None:
+        return
+    # recorded once, by whichever of the hooks below runs first
+    ctx.metrics_started = None
+    metrics.observe(
+        "command_latency_seconds", time.perf_counter() - started,
+        command=ctx.command.qualified_name, status="error" if ctx.command_failed else "ok",
+    )
+
+@bot.before_invoke
+async def start_command_timer(ctx):
+    ctx.metrics_started = time.perf_counter()
+
+@bot.after_invoke
+async def record_command_latency(ctx):
+    _record_command(ctx)
+
+# slash invocations of hybrid commands skip the after-invoke hook when they fail
+@bot.listen("on_command_error")
+async def record_failed_command_latency(ctx, error):
+    _record_command(ctx)
 
 # Safely parse env variables (avoid ValueError on empty string)
 log_channel_id = None
@@ -117,11 +605,6 @@ if _raw_log_id and _raw_log_id.isdigit():
 raw_channel_ids = os.getenv("PURIFY_CHANNEL_IDS", "")
 PURIFY_CHANNEL_IDS = {int(cid.strip()) for cid in raw_channel_ids.split(",") if cid.strip().isdigit()}
 
-TOXIC_WORDS = set()
-if os.path.exists("badwords_en.txt"):
-    with open("badwords_en.txt", "r", encoding="utf-8") as f:
-        TOXIC_WORDS = set(line.strip().lower() for line in f if line.strip())
-
 SHORTCUTS = {}
 def register_shortcuts():
     for command in bot.commands:
@@ -180,89 +663,214 @@ async def auto_purify():
         except Exception as e:
             await log_action(f"Error in auto-purify for #{channel.name if channel else cid}: {e}")
 
+SYNC_SEED_LIMIT = 500
+
+def make_crawler():
+    """History crawler configured from CRAWL_CONCURRENCY / CRAWL_PAGES_PER_SECOND."""
+    return ChannelCrawler(
+        concurrency=_env_number("CRAWL_CONCURRENCY", 4),
+        batch_size=500,
+        max_pages_per_second=_env_number("CRAWL_PAGES_PER_SECOND", 20.0, float) or None,
+    )
+
+def get_sync_high_water(cur, guild_id, channel_id):
+    """Newest message id already synced for a channel, seeded from stored messages the first time."""
+    row = cur.execute("SELECT last_message_id FROM channel_sync_state WHERE channel_id = ?", (channel_id,)).fetchone()
+    if row:
+        return row[0]
+    return cur.execute(
+        "SELECT MAX(message_id) FROM messages WHERE guild_id = ? AND channel_id = ?",
+        (guild_id, channel_id)
+    ).fetchone()[0]
+
+def store_sync_batch(cur, guild_id, channel_id, rows, high_water):
+    """
+    Store a batch of synced rows and advance the channel's high-water mark in the same transaction.
+    Returns the rows that were new.
+    """
+    added = store_new_messages(cur, rows)
+    cur.execute(
+        "INSERT INTO channel_sync_state (channel_id, guild_id, last_message_id) VALUES (?, ?, ?) "
+        "ON CONFLICT(channel_id) DO UPDATE SET guild_id = excluded.guild_id, "
+        "last_message_id = MAX(last_message_id, excluded.last_message_id)",
+        (channel_id, guild_id, high_water)
+    )
+    return added
+
+async def sync_job(channel):
+    """
+    CrawlJob fetching everything newer than the channel's high-water mark, or None if it is up to date.
+    Channels we have never stored anything for only get their latest SYNC_SEED_LIMIT messages;
+    deep history is initcache's job.
+    """
+    high_water = await database.read(get_sync_high_water, channel.guild.id, channel.id)
+    if high_water is None:
+        return CrawlJob(channel, limit=SYNC_SEED_LIMIT, newest_first=True)
+    if channel.last_message_id is not None and channel.last_message_id <= high_water:
+        return None
+    return CrawlJob(channel, after=high_water)
+
+async def write_sync_batch(batch):
+    channel = batch.job.channel
+    if batch.error is not None:
+        print(f"[ERROR] background_cache failed in {channel.name}: {batch.error}")
+    if batch.newest_id is None:
+        return
+    rows = [
+        message_row(message) for message in batch.messages
+        if not (message.author.bot or message.webhook_id is not None or message.guild is None)
+    ]
+    # the mark advances past skipped messages too, so they are not fetched again
+    data_changed(await database.write(store_sync_batch, channel.guild.id, channel.id, rows, batch.newest_id))
+    record_ingest_lag("background_cache", rows)
+
 @tasks.loop(minutes=5)
 async def background_cache():
-    # Fetch recent history from every accessible channel to keep DB up to date
+    # Fetch only what is new since the last sync in every accessible channel.
+    # on_message does not move the high-water mark, so gaps from downtime still get filled.
+    crawler = make_crawler()
     for guild in bot.guilds:
+        jobs = []
         for channel in guild.text_channels:
             # only cache channels we can read
             if not channel.permissions_for(guild.me).read_message_history:
                 continue
             try:
-                async for message in channel.history(limit=500, oldest_first=False):
-                    if message.author.bot or message.webhook_id is not None or message.guild is None:
-                        continue
-                    try:
-                        cursor.execute(
-                            "INSERT OR IGNORE INTO messages (message_id, channel_id, author_id, content, timestamp, guild_id) VALUES (?, ?, ?, ?, ?, ?)",
-                            (message.id, message.channel.id, message.author.id, message.content or "", message.created_at.isoformat(), message.guild.id)
-                        )
-                    except Exception:
-                        cursor.execute(
-                            "INSERT OR IGNORE INTO messages (message_id, channel_id, author_id, content, timestamp, guild_id) VALUES (?, ?, ?, ?, ?, ?)",
-                            (message.id, message.channel.id, message.author.id, (message.content or "").encode("utf-8", errors="replace").decode("utf-8"), message.created_at.isoformat(), message.guild.id)
-                        )
-                db.commit()
-                await asyncio.sleep(0)
+                job = await sync_job(channel)
             except Exception as e:
                 print(f"[ERROR] background_cache failed in {channel.name if channel else 'unknown'}: {e}")
+                continue
+            if job is not None:
+                jobs.append(job)
+        if jobs:
+            await crawler.run(jobs, write_sync_batch)
 
 async def cache_channel_history(guild: discord.Guild):
     # Deep history crawl for a single guild (used internally if needed)
+    jobs = []
     for channel in guild.text_channels:
         if not channel.permissions_for(guild.me).read_message_history:
             print(f"[SKIP] No permission to read {channel.name}")
             continue
-        batch = []
-        try:
-            async for message in channel.history(limit=None, oldest_first=True):
-                if message.author.bot or message.webhook_id is not None or message.guild is None:
-                    continue
-                if message.content and message.content.startswith(('s ', '/')):
-                    # keep previous behavior to ignore bot commands if present
-                    continue
-                batch.append((
-                    message.id,
-                    message.channel.id,
-                    message.author.id,
-                    message.content or "",
-                    message.created_at.isoformat(),
-                    message.guild.id
-                ))
-                if len(batch) >= 500:
-                    cursor.executemany(
-                        "INSERT OR IGNORE INTO messages (message_id, channel_id, author_id, content, timestamp, guild_id) VALUES (?, ?, ?, ?, ?, ?)",
-                        batch
-                    )
-                    db.commit()
-                    batch.clear()
-            if batch:
-                cursor.executemany(
-                    "INSERT OR IGNORE INTO messages (message_id, channel_id, author_id, content, timestamp, guild_id) VALUES (?, ?, ?, ?, ?, ?)",
-                    batch
-                )
-                db.commit()
-                batch.clear()
-        except Exception as e:
-            print(f"[ERROR] cache_channel_history failed for {channel.name}: {e}")
+        jobs.append(CrawlJob(channel))
+
+    async def write(batch):
+        if batch.error is not None:
+            print(f"[ERROR] cache_channel_history failed for {batch.job.channel.name}: {batch.error}")
+        rows = []
+        for message in batch.messages:
+            if message.author.bot or message.webhook_id is not None or message.guild is None:
+                continue
+            if message.content and message.content.startswith(('s ', '/')):
+                # keep previous behavior to ignore bot commands if present
+                continue
+            rows.append(message_row(message))
+        if rows:
+            data_changed(await database.write(store_new_messages, rows))
 
-# --- Utility to generate graphs ---
-def generate_usage_graph(data_dict, title):
-    if not data_dict:
+    await make_crawler().run(jobs, write)
+
+# Multi-word searches are answered from messages_fts (see analytics.fts_query)
+PHRASE_UNAVAILABLE = "Phrase search isn't available on this database (SQLite was built without FTS5)."
+
+def phrase_unavailable(word):
+    """Why `word` can't be searched right now, or None."""
+    if analytics.fts_query(word) is None:
         return None
-    x = sorted(data_dict.keys())
-    y = [data_dict[k] for k in x]
-    plt.figure(figsize=(10, 4))
-    plt.plot(x, y, marker='o')
-    plt.xticks(rotation=45)
-    plt.title(title)
-    plt.tight_layout()
-    buf = BytesIO()
-    plt.savefig(buf, format='png')
-    buf.seek(0)
-    plt.close()
+    if not FTS_ENABLED:
+        return PHRASE_UNAVAILABLE
+    if fts_backfill_after < fts_backfill_until:
+        return "⏳ Phrase search is still indexing older messages. Try again in a while."
+    return None
+
+FTS_BACKFILL_CHUNK_SIZE = _env_number("FTS_BACKFILL_CHUNK_SIZE", 5000)
+
+def backfill_fts_chunk(cur, after_id, until_id, limit):
+    """
+    Add the next `limit` messages after after_id (up to until_id) to messages_fts and
+    record the progress. Rows the triggers already indexed are skipped. Returns the
+    last message id covered. Meant to run through database.write(), one call per chunk.
+    """
+    row = cur.execute(
+        "SELECT message_id FROM messages WHERE message_id > ? AND message_id <= ? ORDER BY message_id LIMIT 1 OFFSET ?",
+        (after_id, until_id, limit - 1)
+    ).fetchone()
+    end = row[0] if row else until_id
+    cur.execute(
+        "INSERT INTO messages_fts (rowid, content) SELECT message_id, content FROM messages "
+        "WHERE message_id > ? AND message_id <= ? "
+        "AND message_id NOT IN (SELECT id FROM messages_fts_docsize WHERE id > ? AND id <= ?)",
+        (after_id, end, after_id, end)
+    )
+    if end >= until_id:
+        cur.execute("DELETE FROM meta WHERE key IN ('fts_backfill_after', 'fts_backfill_until')")
+    else:
+        set_meta(cur, "fts_backfill_after", end)
+    return end
+
+@tasks.loop(seconds=_env_number("FTS_BACKFILL_INTERVAL", 0.5, float))
+async def fts_backfill():
+    global fts_backfill_after
+    try:
+        fts_backfill_after = await database.write(
+            backfill_fts_chunk, fts_backfill_after, fts_backfill_until, FTS_BACKFILL_CHUNK_SIZE
+        )
+    except Exception as e:
+        print(f"⚠️ Full-text index backfill failed, retrying: {e}")
+        return
+    if fts_backfill_after >= fts_backfill_until:
+        print("✅ Full-text index covers every cached message.")
+        fts_backfill.stop()
+
+# --- Utility to generate graphs ---
+# Graphs are drawn in worker processes so a burst of graph commands cannot stall the bot
+graph_renderer = GraphRenderer(
+    workers=_env_number("GRAPH_WORKERS", 1),
+    max_queue=_env_number("GRAPH_MAX_QUEUE", 8),
+    timeout=_env_number("GRAPH_TIMEOUT", 20.0, float),
+)
+metrics.gauge("graph_renders_total", "Graphs drawn by the graph workers.", lambda: graph_renderer.rendered, kind="counter")
+metrics.gauge("graph_renders_in_flight", "Graphs being drawn or waiting for a worker.", lambda: graph_renderer.in_flight)
+metrics.gauge("graph_renders_rejected_total", "Graph requests refused because the render queue was full.", lambda: graph_renderer.rejected, kind="counter")
+metrics.gauge("graph_renderer_available", "1 while graph workers are running, 0 once they have broken.", lambda: int(graph_renderer.available))
+metrics.gauge("graph_renders_timed_out_total", "Graph requests that gave up waiting for a worker.", lambda: graph_renderer.timed_out, kind="counter")
+
+GRAPH_BUSY = "📉 Too many graphs are being drawn right now. Try again in a moment."
+GRAPH_TIMED_OUT = "📉 Drawing that graph took too long. Try again later."
+GRAPH_UNAVAILABLE = "📉 Graphs are unavailable until the bot restarts."
+
+async def generate_usage_graph(data_dict, title):
+    """
+    PNG of the usage graph as a BytesIO, or None if there is no data.
+    Raises GraphRendererBusy / GraphRendererUnavailable / asyncio.TimeoutError.
+    """
+    return await graph_renderer.render(data_dict, title)
+
+async def cached_usage_graph(guild_id, key, fn, args, title):
+    """Usage graph PNG (BytesIO, or None if there is no data) for a graph command, cached along with its data."""
+    png = result_cache.get(guild_id, key + ("png",))
+    if png is not MISS:
+        return BytesIO(png) if png is not None else None
+    generation = result_cache.generation(guild_id)
+    data_dict = await cached_read(guild_id, key, fn, *args)
+    buf = await generate_usage_graph(data_dict, title)
+    result_cache.put(guild_id, key + ("png",), buf.getvalue() if buf else None, generation)
     return buf
 
+async def send_usage_graph(ctx, key, fn, args, title, filename, empty_message):
+    try:
+        buf = await cached_usage_graph(ctx.guild.id, key, fn, args, title)
+    except GraphRendererBusy:
+        return await ctx.send(GRAPH_BUSY)
+    except GraphRendererUnavailable:
+        return await ctx.send(GRAPH_UNAVAILABLE)
+    except asyncio.TimeoutError:
+        return await ctx.send(GRAPH_TIMED_OUT)
+    if buf:
+        await ctx.send(file=discord.File(buf, filename=filename))
+    else:
+        await ctx.send(empty_message)
+
 async def apply_to_all_members(ctx, action, label: str):
     if not ctx.author.guild_permissions.administrator:
         await ctx.send("Administrator permission required.")
@@ -291,9 +899,20 @@ async def apply_to_all_members(ctx, action, label: str):
     await ctx.send(f"{label} applied to {count} members.")
 
 # --- Bot events ---
+# Import-to-on_ready time is printed on the first ready and warned about past the target
+STARTUP_TARGET_SECONDS = _env_number("STARTUP_TARGET_SECONDS", 10.0, float)
+metrics.gauge("startup_seconds", "Seconds from process start (imports) to the first on_ready.", lambda: startup_seconds or 0.0)
+
 @bot.event
 async def on_ready():
+    global startup_seconds
     print(f"✅ Logged in as {bot.user.name}")
+    if startup_seconds is None:
+        mark_startup("gateway")
+        startup_seconds = startup_marks[-1][1] - STARTUP_STARTED
+        print(f"⏱️ Ready {startup_seconds:.2f}s after start ({startup_report()})")
+        if startup_seconds > STARTUP_TARGET_SECONDS:
+            print(f"⚠️ Startup took longer than the {STARTUP_TARGET_SECONDS:g}s target (STARTUP_TARGET_SECONDS).")
     
     try:
         synced = await bot.tree.sync()
@@ -316,13 +935,9 @@ async def on_message(message):
     if message.guild is None:
         return
 
-    # --- Database insert ---
+    # --- Database insert (batched by the ingestion queue) ---
     try:
-        cursor.execute(
-            "INSERT OR IGNORE INTO messages (message_id, channel_id, author_id, content, timestamp, guild_id) VALUES (?, ?, ?, ?, ?, ?)",
-            (message.id, message.channel.id, message.author.id, message.content or "", message.created_at.isoformat(), message.guild.id)
-        )
-        db.commit()
+        await ingest_queue.put(message_row(message))
     except Exception:
         pass
 
@@ -340,7 +955,7 @@ async def on_message(message):
             else:
                 webhook = webhook_cache[channel.id]
 
-            uwu_text = uwu.uwuify(message.content).strip()
+            uwu_text = get_uwu().uwuify(message.content).strip()
             if len(uwu_text) > 2000:
                 uwu_text = uwu_text[:1997] + "..."
             await webhook.send(
@@ -377,106 +992,137 @@ async def on_message(message):
     await bot.process_commands(message)
 
 # --- Counting & analysis commands (now guild-scoped) ---
-@bot.hybrid_command(name="count", description="Count how often a word was said in the server.")
+@bot.hybrid_command(name="count", description="Count how often a word (or phrase, or 'near word word') was said in the server.")
 async def count(ctx, *, word: str):
     word = word.lower()
     if ctx.guild is None:
         return await ctx.send("This command must be used in a server.")
-    cursor.execute("SELECT author_id, content FROM messages WHERE guild_id = ?", (ctx.guild.id,))
-    rows = cursor.fetchall()
-    total = 0
-    user_counts = Counter()
-    for author_id, content in rows:
-        tokens = tokenize_text(content or "", stopwords)
-        count_ = tokens.count(word)
-        if count_ > 0:
-            user_counts[author_id] += count_
-            total += count_
+    unavailable = phrase_unavailable(word)
+    if unavailable:
+        return await ctx.send(unavailable)
+    rows = await cached_read(ctx.guild.id, ("count", word), analytics.word_counts, word)
+    unit = "message(s)" if analytics.fts_query(word) is not None else "time(s)"
+    total = sum(count_ for _, count_ in rows)
     if total == 0:
         await ctx.send(f"Not one soul has deemed `{word}` worth using except you. Loser.")
         return
-    top_users = user_counts.most_common(10)
+    top_users = rows[:10]
     result_lines = []
     for uid, count_ in top_users:
         user = ctx.guild.get_member(uid)
         name = user.display_name if user else f"User {uid}"
-        result_lines.append(f"**{name}** — {count_} time(s)")
+        result_lines.append(f"**{name}** — {count_} {unit}")
     await ctx.send(f"**📊 Here you go your highness, your stupid chart for `{word}`:**\n🔢 Total Mentions: `{total}`\n\n🏆 **Top 10 Users:**\n" + "\n".join(result_lines))
 count.shortcut = "c"
 
-@bot.hybrid_command(name="usercount", description="See how often a user said a word.")
+@bot.hybrid_command(name="usercount", description="See how often a user said a word (or a quoted phrase).")
 async def usercount(ctx, word: str, member: discord.Member):
     word = word.lower()
     if ctx.guild is None:
         return await ctx.send("This command must be used in a server.")
-    cursor.execute("SELECT content FROM messages WHERE author_id = ? AND guild_id = ?", (member.id, ctx.guild.id))
-    messages = cursor.fetchall()
-    count_ = sum(tokenize_text(msg[0] or "", stopwords).count(word) for msg in messages)
-    await ctx.send(f"**{member.display_name}** has said `{word}` **{count_}** time(s). What a bitch.")
+    unavailable = phrase_unavailable(word)
+    if unavailable:
+        return await ctx.send(unavailable)
+    count_ = await cached_read(ctx.guild.id, ("usercount", word, member.id), analytics.user_word_count, word, member.id)
+    if analytics.fts_query(word) is not None:
+        await ctx.send(f"**{member.display_name}** has said `{word}` in **{count_}** message(s). What a bitch.")
+    else:
+        await ctx.send(f"**{member.display_name}** has said `{word}` **{count_}** time(s). What a bitch.")
 usercount.shortcut = "uc"
 
-@bot.hybrid_command(name="top10", description="Show top 10 most used words in the server.")
-async def top10(ctx):
+@bot.hybrid_command(name="top10", description="Show top 10 most used words in the server ('live' for a fast estimate of recent ones).")
+@app_commands.describe(mode="'live' answers from the in-memory summary of messages seen since it started")
+async def top10(ctx, mode: str = None):
     if ctx.guild is None:
         return await ctx.send("This command must be used in a server.")
-    cursor.execute("SELECT content FROM messages WHERE guild_id = ?", (ctx.guild.id,))
-    rows = cursor.fetchall()
-    word_counter = Counter()
-    for (content,) in rows:
-        words = tokenize_text(content or "", stopwords)
-        for w in words:
-            if w and w not in stopwords:
-                word_counter[w] += 1
-    top = word_counter.most_common(10)
+    if mode and mode.lower() == "live":
+        return await live_top10(ctx)
+    top = await cached_read(ctx.guild.id, ("top10",), analytics.top_words)
     msg = "**📊 Top 10 Most Used Words in this Godforsaken Place (Filtered):**\n" + "\n".join([f"`{w}` — {c} time(s)" for w, c in top])
     await ctx.send(msg)
 top10.shortcut = "top"
 
+async def live_top10(ctx):
+    summary = live_sketches.get(ctx.guild.id) if live_sketches is not None else None
+    if summary is None:
+        if live_sketches is None or not live_sketches.tracks(ctx.guild.id):
+            return await ctx.send("Live top words aren't kept for this server (see SKETCH_GUILDS).")
+        return await ctx.send("Nothing counted live yet. Say something.")
+    own = live_stopwords.get(ctx.guild.id)
+    if own is None:
+        own = live_stopwords[ctx.guild.id] = frozenset((await database.read(guild_stopwords, ctx.guild.id))[0])
+    top = summary.top(10, exclude=(stopwords, own))
+    lines = [f"`{w}` — ~{c} time(s)" + (f" (up to {err} fewer)" if err else "") for w, c, err, _ in top]
+    msg = (
+        "**⚡ Live Top 10 (estimated, filtered):**\n" + "\n".join(lines)
+        + f"\n-# From {summary.total:,} words in messages stored since tracking started; any count is at most {math.ceil(summary.max_error):,} too high."
+    )
+    await ctx.send(msg)
+
 @bot.hybrid_command(name="mylist", description="Show your personal top 10 most used words.")
 async def mylist(ctx):
     if ctx.guild is None:
         return await ctx.send("This command must be used in a server.")
-    user_id = ctx.author.id
-    cursor.execute("SELECT content FROM messages WHERE author_id = ? AND guild_id = ?", (user_id, ctx.guild.id))
-    rows = cursor.fetchall()
-    word_counter = Counter()
-    for (content,) in rows:
-        cleaned = tokenize_text(content or "", stopwords)
-        for word in cleaned:
-            if word and word not in stopwords:
-                word_counter[word] += 1
-    if not word_counter:
+    top_words = await cached_read(ctx.guild.id, ("mylist", ctx.author.id), analytics.user_top_words, ctx.author.id)
+    if not top_words:
         await ctx.send("You haven't said anything interesting yet. Have you tried sucking a little less?")
         return
-    top_words = word_counter.most_common(10)
     result_lines = [f"`{word}` — {count_} time(s)" for word, count_ in top_words]
     await ctx.send("**🧠 Your Top 10 Words, you fuckin narcissist:**\n" + "\n".join(result_lines))
 mylist.shortcut = "me"
 
+@bot.hybrid_command(name="stopwords", description="List this server's extra stopwords, or add/remove some. (Admin only to change)")
+async def stopwords_command(ctx, action: str = "list", *, words: str = None):
+    if ctx.guild is None:
+        return await ctx.send("This command must be used in a server.")
+    action = action.lower()
+    if action == "list":
+        own, defaults = await database.read(guild_stopwords, ctx.guild.id)
+        listed = ", ".join(f"`{w}`" for w in own) if own else "none"
+        report_text = f"🚫 Stopwords left out of top10/mylist: {defaults:,} defaults from stopwords.txt, plus this server's own: {listed}"
+        if len(report_text) > 1800:
+            buf = BytesIO("\n".join(own).encode("utf-8"))
+            buf.seek(0)
+            return await ctx.send(
+                f"🚫 {defaults:,} default stopwords plus {len(own):,} of this server's own (attached).",
+                file=discord.File(fp=buf, filename=f"stopwords_{ctx.guild.id}.txt")
+            )
+        return await ctx.send(report_text)
+    if action not in ("add", "remove"):
+        return await ctx.send("Usage: `stopwords [list]`, `stopwords add <words...>` or `stopwords remove <words...>`")
+    if not is_guild_admin(ctx):
+        return await ctx.send("❌ You must be a server administrator to use this command.", delete_after=5)
+    word_list = sorted({w for w in (words or "").lower().split() if w})
+    if not word_list:
+        return await ctx.send(f"Give me some words to {action}.")
+    if action == "add":
+        changed = await database.write(add_guild_stopwords, ctx.guild.id, word_list)
+        note = f"✅ Added {changed} stopword(s)."
+    else:
+        changed = await database.write(remove_guild_stopwords, ctx.guild.id, word_list)
+        note = f"✅ Removed {changed} stopword(s)."
+        if changed < len(word_list):
+            note += " (Only this server's own stopwords can be removed; the defaults come from stopwords.txt.)"
+    # top lists read the stopwords table, so cached ones are out of date now
+    result_cache.bump([ctx.guild.id])
+    live_stopwords.pop(ctx.guild.id, None)
+    await ctx.send(note + " Top lists reflect it right away.")
+
 @bot.hybrid_command(name="daily", description="Hourly usage graph of a word (today).")
 async def daily(ctx, *, word: str):
     word = word.lower()
     if ctx.guild is None:
         return await ctx.send("This command must be used in a server.")
-    cursor.execute("SELECT timestamp, content FROM messages WHERE guild_id = ?", (ctx.guild.id,))
-    rows = cursor.fetchall()
-    today = datetime.datetime.utcnow().date()
-    usage_by_hour = {}
-    for timestamp, content in rows:
-        try:
-            ts = datetime.datetime.fromisoformat(timestamp)
-        except Exception:
-            continue
-        if ts.date() != today:
-            continue
-        if word in tokenize_text(content or "", stopwords):
-            hour = ts.strftime("%H:00")
-            usage_by_hour[hour] = usage_by_hour.get(hour, 0) + 1
-    buf = generate_usage_graph(usage_by_hour, f"Here's your fuckin graph for '{word}' today. Asshole.")
-    if buf:
-        await ctx.send(file=discord.File(buf, filename="daily.png"))
-    else:
-        await ctx.send(f"No one said `{word}` today. Bet you feel stupid now, don't you.")
+    unavailable = phrase_unavailable(word)
+    if unavailable:
+        return await ctx.send(unavailable)
+    # the day is part of the key so yesterday's graph is not served after midnight
+    today = int(time.time()) // 86400
+    await send_usage_graph(
+        ctx, ("daily", word, today), analytics.daily_usage, (word, today * 86400),
+        f"Here's your fuckin graph for '{word}' today. Asshole.", "daily.png",
+        f"No one said `{word}` today. Bet you feel stupid now, don't you."
+    )
 daily.shortcut = "day"
 
 @bot.hybrid_command(name="thisweek", description="Daily usage graph (last 7 days).")
@@ -484,45 +1130,30 @@ async def thisweek(ctx, *, word: str):
     word = word.lower()
     if ctx.guild is None:
         return await ctx.send("This command must be used in a server.")
-    cursor.execute("SELECT timestamp, content FROM messages WHERE guild_id = ?", (ctx.guild.id,))
-    rows = cursor.fetchall()
-    today = datetime.datetime.utcnow().date()
-    usage_by_day = {}
-    for timestamp, content in rows:
-        try:
-            ts = datetime.datetime.fromisoformat(timestamp)
-        except Exception:
-            continue
-        if (today - ts.date()).days > 6:
-            continue
-        if word in tokenize_text(content or "", stopwords):
-            day = ts.strftime("%a %m/%d")
-            usage_by_day[day] = usage_by_day.get(day, 0) + 1
-    buf = generate_usage_graph(usage_by_day, f"Fuck you and your graph for '{word}' (last 7 days)")
-    if buf:
-        await ctx.send(file=discord.File(buf, filename="thisweek.png"))
-    else:
-        await ctx.send(f"Nobody said `{word}` this week. Dumbass.")
+    unavailable = phrase_unavailable(word)
+    if unavailable:
+        return await ctx.send(unavailable)
+    today = int(time.time()) // 86400
+    await send_usage_graph(
+        ctx, ("thisweek", word, today), analytics.weekly_usage, (word, today * 86400),
+        f"Fuck you and your graph for '{word}' (last 7 days)", "thisweek.png",
+        f"Nobody said `{word}` this week. Dumbass."
+    )
 thisweek.shortcut = "week"
 
-@bot.hybrid_command(name="alltime", description="All-time usage graph of a word.")
+@bot.hybrid_command(name="alltime", description="All-time usage graph of a word (or phrase, or 'near word word').")
 async def alltime(ctx, *, word: str):
     word = word.lower()
     if ctx.guild is None:
         return await ctx.send("This command must be used in a server.")
-    cursor.execute("SELECT timestamp, content FROM messages WHERE guild_id = ?", (ctx.guild.id,))
-    rows = cursor.fetchall()
-    usage_by_day = {}
-    for timestamp, content in rows:
-        if word in tokenize_text(content or "", stopwords):
-            # timestamp stored in ISO; take date
-            day = timestamp.split("T")[0]
-            usage_by_day[day] = usage_by_day.get(day, 0) + 1
-    buf = generate_usage_graph(usage_by_day, f"All-time usage of '{word}'")
-    if buf:
-        await ctx.send(file=discord.File(buf, filename="alltime.png"))
-    else:
-        await ctx.send(f"No usage of `{word}` found in all-time history.")
+    unavailable = phrase_unavailable(word)
+    if unavailable:
+        return await ctx.send(unavailable)
+    await send_usage_graph(
+        ctx, ("alltime", word), analytics.alltime_usage, (word,),
+        f"All-time usage of '{word}'", "alltime.png",
+        f"No usage of `{word}` found in all-time history."
+    )
 alltime.shortcut = "all"
 
 @bot.hybrid_command(name="whoinvented", description="Find the first user to say a word.")
@@ -530,14 +1161,13 @@ async def whoinvented(ctx, *, word: str):
     word = word.lower()
     if ctx.guild is None:
         return await ctx.send("This command must be used in a server.")
-    cursor.execute("SELECT author_id, timestamp, content FROM messages WHERE guild_id = ? ORDER BY timestamp ASC", (ctx.guild.id,))
-    rows = cursor.fetchall()
-    for author_id, timestamp, content in rows:
-        if word in tokenize_text(content or "", stopwords):
-            user = ctx.guild.get_member(author_id)
-            name = user.display_name if user else f"User {author_id}"
-            await ctx.send(f"`{word}` was first said by **{name}** on `{timestamp}`. What a legend.")
-            return
+    row = await cached_read(ctx.guild.id, ("whoinvented", word), analytics.first_use, word)
+    if row:
+        author_id, timestamp = row
+        user = ctx.guild.get_member(author_id)
+        name = user.display_name if user else f"User {author_id}"
+        await ctx.send(f"`{word}` was first said by **{name}** on `{timestamp}`. What a legend.")
+        return
     await ctx.send(f"No one has said `{word}` yet. Do it yourself, coward.")
 whoinvented.shortcut = "inv"
 
@@ -546,41 +1176,24 @@ whoinvented.shortcut = "inv"
 async def toxicityrank(ctx, user: discord.Member = None):
     if ctx.guild is None:
         return await ctx.send("This command must be used in a server.")
-    cursor.execute("SELECT author_id, content FROM messages WHERE guild_id = ?", (ctx.guild.id,))
-    rows = cursor.fetchall()
-    
-    toxicity = Counter()
-    for author_id, content in rows:
-        words = tokenize_text(content or "", stopwords)
-        count_ = sum(1 for w in words if w in TOXIC_WORDS)
-        if count_ > 0:
-            toxicity[author_id] += count_
-    
-    if not toxicity:
+    top = await cached_read(ctx.guild.id, ("toxicityrank",), analytics.toxicity_leaderboard)
+
+    if not top:
         await ctx.send("This server is suspiciously wholesome.")
         return
 
     if user:
-        user_msgs = [content for uid, content in rows if uid == user.id]
-        user_words = Counter()
-        for msg in user_msgs:
-            words = tokenize_text(msg or "", stopwords)
-            for w in words:
-                if w in TOXIC_WORDS:
-                    user_words[w] += 1
+        rank, user_words = await cached_read(ctx.guild.id, ("toxicityrank", user.id), analytics.user_toxicity, user.id)
         if not user_words:
             await ctx.send(f"**{user.display_name}** has not said anything toxic (yet).")
             return
-        sorted_users = [uid for uid, _ in toxicity.most_common()]
-        rank = sorted_users.index(user.id) + 1 if user.id in sorted_users else "Unranked"
         msg = f"**☣️ Toxicity Report for {user.display_name}**\n"
         msg += f"**Rank:** {rank}\n"
         msg += "**Top 10 Toxic Words:**\n"
-        for word_, count in user_words.most_common(10):
+        for word_, count in user_words:
             msg += f"`{word_}` — {count} time(s)\n"
         await ctx.send(msg)
     else:
-        top = toxicity.most_common(10)
         msg = "**☣️ Top 10 Most Based Users:**\n"
         for uid, count_ in top:
             member = ctx.guild.get_member(uid)
@@ -735,62 +1348,273 @@ async def stopstalk(ctx, target: str = None, member: discord.Member = None):
     get_guild_state(stalked_user_ids, ctx.guild.id).discard(member.id)
     await ctx.send(f"Stopped stalking {member.mention}.")
         
-@bot.hybrid_command(name="initcache", description="Deep crawl to cache ALL messages in server history (fresh).")
-async def initcache(ctx):
+# --- Resumable deep crawl (initcache) ---
+CRAWL_BATCH_SIZE = 500
+
+def prepare_crawl(cur, guild_id, channels, restart):
+    """
+    Register channels for a deep crawl and return {channel_id: (status, last_message_id)}.
+    channels are (channel_id, newest_message_id) pairs. restart=True forgets previous progress.
+    """
+    now = time.time()
+    if restart:
+        cur.execute("DELETE FROM crawl_progress WHERE guild_id = ?", (guild_id,))
+    cur.executemany(
+        "INSERT OR IGNORE INTO crawl_progress (channel_id, guild_id, target_message_id, started_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+        [(cid, guild_id, newest, now, now) for cid, newest in channels]
+    )
+    # a new run (fresh or resumed) measures its rate from here
+    cur.execute(
+        "UPDATE crawl_progress SET run_started_at = ?, updated_at = ?, run_start_message_id = "
+        "CASE WHEN status = 'complete' THEN COALESCE(target_message_id, channel_id) ELSE last_message_id END "
+        "WHERE guild_id = ?",
+        (now, now, guild_id)
+    )
+    rows = cur.execute("SELECT channel_id, status, last_message_id FROM crawl_progress WHERE guild_id = ?", (guild_id,)).fetchall()
+    return {cid: (status, last_id) for cid, status, last_id in rows}
+
+def save_crawl_batch(cur, channel_id, rows, last_message_id, status, error=None):
+    """Store a crawl batch and checkpoint the channel in the same transaction. Returns the rows that were new."""
+    added = store_new_messages(cur, rows)
+    cur.execute(
+        "UPDATE crawl_progress SET status = ?, last_message_id = COALESCE(?, last_message_id), "
+        "messages_cached = messages_cached + ?, updated_at = ?, error = ? WHERE channel_id = ?",
+        (status, last_message_id, len(rows), time.time(), error, channel_id)
+    )
+    return added
+
+CRAWL_ETA_COLUMNS = "channel_id, status, last_message_id, target_message_id, run_started_at, run_start_message_id, updated_at"
+
+def crawl_eta(rows):
+    """
+    Estimate (fraction_done, seconds_left) from crawl_progress rows of CRAWL_ETA_COLUMNS.
+    Progress is measured in snowflake time between a channel's creation and its newest
+    message, so it assumes a roughly even message rate. The rate comes from the latest
+    run only, from its start to its last checkpoint, so downtime between runs does not
+    count. seconds_left is None when unknown.
+    """
+    total_span = done_span = start_span = 0
+    started = last_update = None
+    for channel_id, status, last_id, target_id, run_started_at, run_start_id, updated_at in rows:
+        if run_started_at is not None:
+            started = run_started_at if started is None else min(started, run_started_at)
+        if updated_at is not None:
+            last_update = updated_at if last_update is None else max(last_update, updated_at)
+        span = (target_id or channel_id) - channel_id
+        total_span += span
+        if status == "complete":
+            done_span += span
+        elif last_id:
+            done_span += min(max(last_id - channel_id, 0), span)
+        if run_start_id:
+            start_span += min(max(run_start_id - channel_id, 0), span)
+    if total_span <= 0:
+        return 1.0, 0
+    fraction = done_span / total_span
+    progressed = done_span - start_span
+    if started is None or last_update is None or progressed <= 0 or last_update <= started:
+        return fraction, None
+    return fraction, (total_span - done_span) * (last_update - started) / progressed
+
+@bot.hybrid_command(name="initcache", description="Deep crawl to cache ALL messages in server history (resumes where it stopped).")
+@app_commands.describe(restart="Set to true to forget saved progress and crawl every channel from the beginning.")
+async def initcache(ctx, restart: bool = False):
     if not is_guild_admin(ctx):
         return await ctx.send("❌ You must be a server administrator to use this command.", delete_after=5)
 
     await ctx.defer(ephemeral=False)
-    await ctx.channel.send("🧠 Starting full deep cache of ALL server messages. This may take a while...")
+
+    readable = []
+    for channel in ctx.guild.text_channels:
+        if not channel.permissions_for(ctx.guild.me).read_message_history:
+            print(f"[SKIP] No permission to read {channel.name}")
+            continue
+        readable.append(channel)
+
+    progress = await database.write(
+        prepare_crawl, ctx.guild.id, [(ch.id, ch.last_message_id) for ch in readable], restart
+    )
+    remaining = [ch for ch in readable if progress.get(ch.id, ("pending", None))[0] != "complete"]
+    if not remaining:
+        return await ctx.channel.send("✅ Deep cache already complete for every channel. Use `restart: true` to crawl again.")
+    resumed = sum(1 for ch in remaining if progress.get(ch.id, ("pending", None))[1])
+    await ctx.channel.send(
+        f"🧠 Deep caching {len(remaining)} of {len(readable)} channels"
+        + (f" ({resumed} resuming from a checkpoint)" if resumed else "")
+        + ". This may take a while... Check `cachestatus` for progress."
+    )
 
     total_cached = 0
     progress_update_interval = 1000
-    batch = []
 
-    for channel in ctx.guild.text_channels:
-        try:
-            if not channel.permissions_for(ctx.guild.me).read_message_history:
-                print(f"[SKIP] No permission to read {channel.name}")
-                continue
+    async def write(batch):
+        nonlocal total_cached
+        channel = batch.job.channel
+        rows = [
+            message_row(message, ctx.guild.id) for message in batch.messages
+            if not (message.author.bot or message.webhook_id is not None)
+        ]
+        if batch.error is not None:
+            print(f"[ERROR] Failed to cache channel {channel.name}: {batch.error}")
+            status, error = "error", str(batch.error)[:500]
+        else:
+            status, error = ("complete" if batch.done else "running"), None
+        # checkpoint past skipped messages too so a resume does not refetch them
+        data_changed(await database.write(save_crawl_batch, channel.id, rows, batch.last_id, status, error))
 
-            async for message in channel.history(limit=None, oldest_first=True):
-                if message.author.bot or message.webhook_id is not None:
-                    continue
+        before = total_cached
+        total_cached += len(rows)
+        if total_cached // progress_update_interval > before // progress_update_interval:
+            await ctx.channel.send(f"📊 Cached {total_cached} messages so far...")
 
-                batch.append((
-                    message.id,
-                    message.channel.id,
-                    message.author.id,
-                    message.content or "",
-                    message.created_at.isoformat(),
-                    ctx.guild.id
-                ))
-                total_cached += 1
-
-                if len(batch) >= 500:
-                    cursor.executemany(
-                        "INSERT OR IGNORE INTO messages (message_id, channel_id, author_id, content, timestamp, guild_id) VALUES (?, ?, ?, ?, ?, ?)",
-                        batch
-                    )
-                    db.commit()
-                    batch.clear()
-
-                if total_cached % progress_update_interval == 0:
-                    await ctx.channel.send(f"📊 Cached {total_cached} messages so far...")
-
-            # Flush leftover for this channel
-            if batch:
-                cursor.executemany(
-                    "INSERT OR IGNORE INTO messages (message_id, channel_id, author_id, content, timestamp, guild_id) VALUES (?, ?, ?, ?, ?, ?)",
-                    batch
-                )
-                db.commit()
-                batch.clear()
+    jobs = [CrawlJob(ch, after=progress.get(ch.id, ("pending", None))[1]) for ch in remaining]
+    await make_crawler().run(jobs, write)
 
-        except Exception as e:
-            print(f"[ERROR] Failed to cache channel {channel.name}: {e}")
+    await ctx.channel.send(f"✅ Deep cache run finished. Cached {total_cached} messages this run.")
+
+@bot.hybrid_command(name="cachestatus", description="Show initcache progress and an ETA for this server. (Admin only)")
+async def cachestatus(ctx):
+    if not is_guild_admin(ctx):
+        return await ctx.send("❌ You must be a server administrator to use this command.", delete_after=5)
 
-    await ctx.channel.send(f"✅ Deep cache complete. Cached {total_cached} messages total.")
+    rows = await database.fetchall(
+        f"SELECT {CRAWL_ETA_COLUMNS}, messages_cached, error "
+        "FROM crawl_progress WHERE guild_id = ? ORDER BY channel_id",
+        (ctx.guild.id,)
+    )
+    if not rows:
+        return await ctx.send("No deep cache has been started for this server. Run `initcache` first.")
+
+    fraction, eta = crawl_eta([r[:7] for r in rows])
+    statuses = Counter(r[1] for r in rows)
+    lines = [
+        f"Deep cache for {ctx.guild.name}: {fraction * 100:.1f}% done (estimated)",
+        f"Channels: {statuses.get('complete', 0)} complete, {statuses.get('running', 0)} running, "
+        f"{statuses.get('pending', 0)} pending, {statuses.get('error', 0)} errored",
+        f"Messages cached by the crawl: {sum(r[7] for r in rows):,}",
+        f"ETA: {datetime.timedelta(seconds=int(eta)) if eta is not None else 'unknown'}",
+        "",
+    ]
+    for row in rows:
+        channel_id, status, cached, error = row[0], row[1], row[7], row[8]
+        channel = ctx.guild.get_channel(channel_id)
+        name = channel.name if channel else channel_id
+        ch_fraction, _ = crawl_eta([row[:7]])
+        line = f"#{name}: {status} {ch_fraction * 100:.0f}% ({cached:,} msgs)"
+        if error:
+            line += f" — {error[:100]}"
+        lines.append(line)
+
+    report_text = "\n".join(lines)
+    if len(report_text) > 1800:
+        buf = BytesIO(report_text.encode("utf-8"))
+        buf.seek(0)
+        await ctx.send(file=discord.File(fp=buf, filename=f"cachestatus_{ctx.guild.id}.txt"))
+    else:
+        await ctx.send("```\n" + report_text + "\n```")
+
+def format_seconds(seconds):
+    if seconds is None:
+        return "-"
+    if seconds < 0.001:
+        return f"{seconds * 1e6:.0f}µs"
+    if seconds < 1:
+        return f"{seconds * 1000:.1f}ms"
+    if seconds < 120:
+        return f"{seconds:.2f}s"
+    return str(datetime.timedelta(seconds=int(seconds)))
+
+def histogram_line(label, hist):
+    return (
+        f"{label}: {hist.count:,} × p50 {format_seconds(hist.quantile(0.5))}, "
+        f"p95 {format_seconds(hist.quantile(0.95))}, max {format_seconds(hist.max)}"
+    )
+
+def metrics_report():
+    uptime = datetime.timedelta(seconds=int(time.time() - metrics.started_at))
+    lines = [f"Bot metrics (uptime {uptime})"]
+    if startup_seconds is not None:
+        lines.append(f"Startup: ready in {startup_seconds:.2f}s ({startup_report()})")
+    lines.append("")
+
+    lines.append("Commands:")
+    commands_seen = sorted(metrics.series("command_latency_seconds").items(), key=lambda kv: -kv[1].count)
+    for key, hist in commands_seen:
+        labels = dict(key)
+        status = "" if labels["status"] == "ok" else f" [{labels['status']}]"
+        lines.append("  " + histogram_line(f"{labels['command']}{status}", hist))
+    if not commands_seen:
+        lines.append("  none yet")
+
+    lines.append("")
+    lines.append("Database (slowest in total first):")
+    queries = sorted(metrics.series("db_query_seconds").items(), key=lambda kv: -kv[1].sum)
+    for key, hist in queries[:15]:
+        labels = dict(key)
+        lines.append(f"  {labels['op']} " + histogram_line(labels["query"], hist) + f", total {format_seconds(hist.sum)}")
+    if len(queries) > 15:
+        lines.append(f"  ... and {len(queries) - 15} more")
+    for key, hist in sorted(metrics.series("db_wait_seconds").items()):
+        lines.append("  " + histogram_line(f"waiting for a {dict(key)['op']} thread", hist))
+    lines.append(f"  in flight: {database.pending['read']} read(s), {database.pending['write']} write(s)")
+
+    queue = ingest_queue.stats()
+    lines.append("")
+    lines.append("Ingestion:")
+    lines.append(
+        f"  queue depth {queue['depth']:,}, {queue['rows_flushed']:,} rows in {queue['flushes']:,} flushes "
+        f"(avg {queue['avg_flush_ms']:.1f}ms, max {queue['max_flush_ms']:.1f}ms), {queue['failed_flushes']} failed ({queue['rows_dropped']:,} rows lost)"
+    )
+    for key, hist in sorted(metrics.series("ingest_lag_seconds").items()):
+        lines.append("  " + histogram_line(f"lag sent → committed ({dict(key)['source']})", hist))
+
+    cache = result_cache.stats()
+    lines.append("")
+    lines.append("Result cache:")
+    lines.append(
+        f"  {cache['entries']:,} entries, {cache['bytes'] / 1048576:.1f} of {cache['max_bytes'] / 1048576:.0f} MB, "
+        f"{cache['hits']:,} hits / {cache['misses']:,} misses ({cache['hit_rate'] * 100:.1f}% hit rate), "
+        f"{cache['stale']:,} stale, {cache['evictions']:,} evicted"
+    )
+
+    if live_sketches is not None:
+        summaries = live_sketches.sketches.values()
+        lines.append("")
+        lines.append("Live top words:")
+        lines.append(
+            f"  {len(summaries):,} guild(s) × capacity {live_sketches.capacity:,}, "
+            f"{sum(s.total for s in summaries):,} words seen, snapshot to {SKETCH_PATH}"
+        )
+    return "\n".join(lines)
+
+@bot.hybrid_command(name="stats", description="Show command latencies, database timings and ingestion lag. (Admin only)")
+async def stats(ctx):
+    if not is_guild_admin(ctx):
+        return await ctx.send("❌ You must be a server administrator to use this command.", delete_after=5)
+    if not metrics.enabled:
+        return await ctx.send("Metrics are turned off (METRICS=0).")
+
+    report_text = metrics_report()
+    if len(report_text) > 1800:
+        buf = BytesIO(report_text.encode("utf-8"))
+        buf.seek(0)
+        await ctx.send(file=discord.File(fp=buf, filename="stats.txt"))
+    else:
+        await ctx.send("```\n" + report_text + "\n```")
+
+@bot.hybrid_command(name="flushcache", description="Drop cached command results and graphs for this server, or 'all'. (Admin only)")
+async def flushcache(ctx, scope: str = None):
+    if not is_guild_admin(ctx):
+        return await ctx.send("❌ You must be a server administrator to use this command.", delete_after=5)
+    cache = result_cache.stats()
+    if scope == "all":
+        dropped = result_cache.flush()
+    else:
+        dropped = result_cache.flush(ctx.guild.id)
+    await ctx.send(
+        f"🧹 Dropped {dropped:,} cached result(s). Since startup: {cache['hits']:,} hits, "
+        f"{cache['misses']:,} misses ({cache['hit_rate'] * 100:.1f}% hit rate)."
+    )
 
 @bot.hybrid_command(name="uwulock")
 async def uwulock(ctx, target: str = None, member: discord.Member = None):
@@ -832,55 +1656,172 @@ async def unlock(ctx, target: str = None, member: discord.Member = None):
     get_guild_state(uwulocked_user_ids, ctx.guild.id).discard(member.id)
     await ctx.send(f"{member.mention} has been unlocked.")
 
-@bot.hybrid_command(
-    name="verifycache",
-    description="Verify cached message counts vs Discord history for this guild. (Admin only)"
-)
-@app_commands.describe(
-    find_missing="Set to true to sample messages and reveal some missing cached messages (slow).",
-    sample_per_channel="How many sample messages to check per channel when finding missing messages."
-)
-async def verifycache(ctx, find_missing: bool = False, sample_per_channel: int = 5):
-    if not is_guild_admin(ctx):
-        return await ctx.send("❌ You must be a server administrator to use this command.", delete_after=5)
+VERIFY_SAMPLE_WINDOWS = 12
+VERIFY_WINDOW_SIZE = 50
 
-    await ctx.defer(ephemeral=False)
-    guild = ctx.guild
-    if guild is None:
-        return await ctx.send("This command must be run in a guild (server).")
+def cached_counts_by_channel(cur, guild_id):
+    """{channel_id: stored messages} for a guild, from one pass over idx_messages_guild_channel."""
+    return dict(cur.execute(
+        "SELECT channel_id, COUNT(*) FROM messages WHERE guild_id = ? GROUP BY channel_id", (guild_id,)
+    ).fetchall())
+
+def sample_window_starts(channel, windows, now=None):
+    """
+    Snowflake ids to start sample windows from, one at a random point in each of `windows`
+    equal slices of the channel's lifetime (its creation up to its newest message).
+    """
+    start = channel.id
+    end = channel.last_message_id or ((int((now or time.time()) * 1000) - DISCORD_EPOCH_MS) << 22)
+    if end <= start:
+        return [start]
+    step = (end - start) / windows
+    return [int(start + step * (i + random.random())) for i in range(windows)]
+
+def coverage_interval(windows, z=1.96):
+    """
+    Cached fraction and ~95% confidence interval from sample windows of (sampled, cached) counts.
+    Messages within a window are consecutive, not independent, so the interval is the wider of
+    the Wilson interval over all sampled messages and a per-window (cluster) interval.
+    Returns (coverage, low, high), or None when nothing was sampled.
+    """
+    n = sum(sampled for sampled, _ in windows)
+    if not n:
+        return None
+    p = sum(cached for _, cached in windows) / n
+    centre = (p + z * z / (2 * n)) / (1 + z * z / n)
+    half = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / (1 + z * z / n)
+    low, high = centre - half, centre + half
+    m = sum(1 for sampled, _ in windows if sampled)
+    if m > 1:
+        var = m / (m - 1) * sum((cached - p * sampled) ** 2 for sampled, cached in windows) / (n * n)
+        half = z * math.sqrt(var)
+        low, high = min(low, p - half), max(high, p + half)
+    return p, max(0.0, low), min(1.0, high)
+
+def format_coverage(interval):
+    coverage, low, high = interval
+    return f"{coverage * 100:.1f}% (95% CI {low * 100:.1f}–{high * 100:.1f}%)"
+
+def missing_report_line(channel, message):
+    return (
+        f"Missing in DB — channel=#{channel.name} author={message.author.display_name} "
+        f"ts={message.created_at.isoformat()} msg_id={message.id} content_snip={repr((message.content or '')[:300])[:200]}"
+    )
+
+async def verify_by_sampling(channels, db_counts, windows, find_missing, sample_per_channel):
+    """
+    Spot-check coverage with one short history request per sample window.
+    Returns (summary_lines, channel_lines, missing_lines).
+    """
+    windows = max(1, min(windows, 50))
+    jobs = [
+        CrawlJob(channel, after=start, limit=VERIFY_WINDOW_SIZE)
+        for channel in channels
+        for start in sample_window_starts(channel, windows)
+    ]
+    sampled = {}
+    failed = Counter()
+
+    async def collect(batch):
+        if batch.error is not None:
+            failed[batch.job.channel.id] += 1
+        sampled.setdefault(batch.job, []).extend(
+            m for m in batch.messages if not (m.author.bot or m.webhook_id is not None)
+        )
+
+    crawler = make_crawler()
+    await crawler.run(jobs, collect)
+    cached = await database.read(cached_message_ids, {m.id for msgs in sampled.values() for m in msgs})
+
+    channel_lines, missing_lines = [], []
+    total_db = sampled_total = uncovered = 0
+    # estimated Discord totals: central, and the bounds from each channel's interval
+    estimated = low_total = high_total = 0
+    for channel in channels:
+        db_count = db_counts.get(channel.id, 0)
+        total_db += db_count
+        # windows in quiet channels can run into each other; count each message once
+        seen = set()
+        channel_windows = []
+        missing = []
+        for job, msgs in sampled.items():
+            if job.channel is not channel:
+                continue
+            fresh = [m for m in msgs if m.id not in seen]
+            seen.update(m.id for m in fresh)
+            hits = sum(1 for m in fresh if m.id in cached)
+            channel_windows.append((len(fresh), hits))
+            missing.extend(m for m in fresh if m.id not in cached)
+        sampled_total += len(seen)
+
+        line = f"#{channel.name}: DB={db_count:,}  Sampled={len(seen):,}"
+        interval = coverage_interval(channel_windows)
+        if interval is None:
+            estimated += db_count
+            low_total += db_count
+            high_total += db_count
+            line += "  (no messages in sample windows)"
+        elif interval[0] == 0:
+            # nothing cached, so the DB says nothing about its size; count what was seen
+            uncovered += 1
+            estimated += db_count + len(missing)
+            low_total += db_count + len(missing)
+            high_total += db_count + len(missing)
+            line += f"  Cached≈{format_coverage(interval)}"
+        else:
+            coverage, low, high = interval
+            estimate = max(round(db_count / coverage), len(seen))
+            estimated += estimate
+            low_total += max(db_count / high, len(seen))
+            high_total += db_count / low if low > 0 else db_count + len(missing)
+            line += f"  Cached≈{format_coverage(interval)}  Est. Discord≈{estimate:,}  Est. missing≈{max(0, estimate - db_count):,}"
+        if failed[channel.id]:
+            line += f"  ({failed[channel.id]} sample requests failed)"
+        channel_lines.append(line)
+
+        if find_missing:
+            missing_lines.extend(missing_report_line(channel, m) for m in missing[:sample_per_channel])
+
+    summary = [
+        f"Sampled messages: {sampled_total:,} from {len(jobs):,} windows ({crawler.pages:,} API requests)",
+        f"Total cached in DB: {total_db:,}",
+        f"Estimated Discord messages (non-bot): ~{estimated:,}",
+    ]
+    if estimated:
+        summary.append(
+            f"Estimated coverage: {format_coverage((total_db / estimated, total_db / high_total, min(1.0, total_db / low_total)))}"
+        )
+    if uncovered:
+        summary.append(f"⚠️ {uncovered} channel(s) had none of their sampled messages cached; only their sampled messages are counted above.")
+    return summary, channel_lines, missing_lines
 
+async def verify_by_walk(ctx, channels, db_counts, find_missing, sample_per_channel):
+    """
+    Count every message in every channel's history. Exact, but one request per 100 messages.
+    Returns (summary_lines, channel_lines, missing_lines).
+    """
     results = []
     total_discord = 0
     total_db = 0
-    channels_checked = 0
     progress_interval = 5
-    long_report_lines = []
-
-    for channel in guild.text_channels:
-        if not channel.permissions_for(guild.me).read_message_history:
-            results.append(f"#{channel.name}: SKIPPED (no read_message_history permission)")
-            continue
+    samples = []
 
-        channels_checked += 1
+    for channels_checked, channel in enumerate(channels, 1):
         discord_count = 0
-        sample_messages = []
+        channel_samples = []
         try:
             async for message in channel.history(limit=None, oldest_first=True):
                 if message.author.bot or message.webhook_id is not None:
                     continue
                 discord_count += 1
-                if find_missing and len(sample_messages) < sample_per_channel:
-                    sample_messages.append((message.id, message.author.display_name, message.created_at.isoformat(), (message.content or "")[:300]))
+                if find_missing and len(channel_samples) < sample_per_channel:
+                    channel_samples.append(message)
         except Exception as e:
             results.append(f"#{channel.name}: ERROR while reading history: {e}")
             continue
+        samples.extend((channel, m) for m in channel_samples)
 
-        cursor.execute("SELECT COUNT(*) FROM messages WHERE channel_id = ? AND guild_id = ?", (channel.id, guild.id))
-        try:
-            db_count = cursor.fetchone()[0]
-        except Exception:
-            db_count = 0
-
+        db_count = db_counts.get(channel.id, 0)
         total_discord += discord_count
         total_db += db_count
 
@@ -888,26 +1829,60 @@ async def verifycache(ctx, find_missing: bool = False, sample_per_channel: int =
         pct_cached = (db_count / discord_count * 100) if discord_count > 0 else 100.0
         results.append(f"#{channel.name}: Discord={discord_count:,}  DB={db_count:,}  Missing={missing:,}  Cached={pct_cached:.1f}%")
 
-        if find_missing and sample_messages:
-            for mid, author_name, ts, content_snip in sample_messages:
-                cursor.execute("SELECT 1 FROM messages WHERE message_id = ? AND guild_id = ? LIMIT 1", (mid, guild.id))
-                exists = cursor.fetchone() is not None
-                if not exists:
-                    long_report_lines.append(f"Missing in DB — channel=#{channel.name} author={author_name} ts={ts} msg_id={mid} content_snip={repr(content_snip)[:200]}")
-
         if channels_checked % progress_interval == 0:
             try:
                 await ctx.channel.send(f"🔁 Progress: checked {channels_checked} channels so far...")
             except Exception:
                 pass
 
+    cached = await database.read(cached_message_ids, {m.id for _, m in samples})
+    missing_lines = [missing_report_line(channel, m) for channel, m in samples if m.id not in cached]
     summary = [
-        f"✅ Verify cache complete for **{guild.name}**",
-        f"Channels checked: {channels_checked}",
         f"Total Discord messages (non-bot): {total_discord:,}",
         f"Total cached in DB: {total_db:,}",
         f"Overall cached: {(total_db/total_discord*100) if total_discord>0 else 100.0:.1f}%"
     ]
+    return summary, results, missing_lines
+
+@bot.hybrid_command(
+    name="verifycache",
+    description="Spot-check cached messages against Discord history for this guild. (Admin only)"
+)
+@app_commands.describe(
+    full="Walk every channel's full history and count exactly instead of sampling (slow).",
+    find_missing="Set to true to list some of the missing messages that were found.",
+    sample_per_channel="How many missing messages to list per channel when find_missing is set.",
+    windows="Sample windows per channel; more is slower but gives a tighter estimate."
+)
+async def verifycache(ctx, full: bool = False, find_missing: bool = False, sample_per_channel: int = 5, windows: int = VERIFY_SAMPLE_WINDOWS):
+    if not is_guild_admin(ctx):
+        return await ctx.send("❌ You must be a server administrator to use this command.", delete_after=5)
+
+    await ctx.defer(ephemeral=False)
+    guild = ctx.guild
+    if guild is None:
+        return await ctx.send("This command must be run in a guild (server).")
+
+    started = time.perf_counter()
+    db_counts = await database.read(cached_counts_by_channel, guild.id)
+    channels = []
+    skipped = []
+    for channel in guild.text_channels:
+        if channel.permissions_for(guild.me).read_message_history:
+            channels.append(channel)
+        else:
+            skipped.append(f"#{channel.name}: SKIPPED (no read_message_history permission)")
+
+    if full:
+        summary, results, long_report_lines = await verify_by_walk(ctx, channels, db_counts, find_missing, sample_per_channel)
+    else:
+        summary, results, long_report_lines = await verify_by_sampling(channels, db_counts, windows, find_missing, sample_per_channel)
+    results = skipped + results
+
+    summary = [
+        f"✅ Verify cache ({'full walk' if full else 'sampled'}) complete for **{guild.name}** in {time.perf_counter() - started:.1f}s",
+        f"Channels checked: {len(channels)}",
+    ] + summary
     body_lines = summary + [""] + ["Per-channel summary:"] + results
     if len(body_lines) > 200 or len("\n".join(results)) > 1500 or (find_missing and long_report_lines):
         report_text = "\n".join(body_lines)
@@ -925,20 +1900,83 @@ async def verifycache(ctx, find_missing: bool = False, sample_per_channel: int =
         pass
 
 # --- Retroactive migration command: backfill guild_id for rows where NULL ---
+def unassigned_counts_by_channel(cur):
+    """{channel_id: rows with no guild_id}, from one pass over idx_messages_guild_channel."""
+    return dict(cur.execute(
+        "SELECT channel_id, COUNT(*) FROM messages WHERE guild_id IS NULL GROUP BY channel_id"
+    ).fetchall())
+
+def assign_channel_guilds(cur, mapping, after_id, limit):
+    """
+    Set guild_id on the next `limit` unassigned rows (by message id, after after_id) from a
+    {channel_id: guild_id} mapping and index them, with one joined UPDATE.
+    Returns (rows updated, last message id, or None when nothing was left).
+    Meant to run through database.write(), one call per chunk so each chunk is its own transaction.
+    """
+    cur.execute("CREATE TEMP TABLE IF NOT EXISTS backfill_guild_map (channel_id INTEGER PRIMARY KEY, guild_id INTEGER NOT NULL)")
+    cur.execute("DELETE FROM backfill_guild_map")
+    cur.executemany("INSERT OR REPLACE INTO backfill_guild_map (channel_id, guild_id) VALUES (?, ?)", mapping.items())
+    # rows without a guild were never indexed; fold them in once they get one
+    rows = cur.execute(
+        "SELECT m.message_id, m.channel_id, m.author_id, m.content, m.timestamp, g.guild_id "
+        "FROM messages m JOIN backfill_guild_map g ON g.channel_id = m.channel_id "
+        "WHERE m.guild_id IS NULL AND m.message_id > ? ORDER BY m.message_id LIMIT ?",
+        (after_id, limit)
+    ).fetchall()
+    if not rows:
+        cur.execute("DROP TABLE backfill_guild_map")
+        return 0, None
+    index_messages(cur, rows)
+    # the chunk is every mapped unassigned row up to its last id
+    cur.execute(
+        "UPDATE messages SET guild_id = (SELECT guild_id FROM backfill_guild_map g WHERE g.channel_id = messages.channel_id) "
+        "WHERE guild_id IS NULL AND message_id > ? AND message_id <= ? "
+        "AND channel_id IN (SELECT channel_id FROM backfill_guild_map)",
+        (after_id, rows[-1][0])
+    )
+    updated = cur.rowcount
+    cur.execute("DROP TABLE backfill_guild_map")
+    return updated, rows[-1][0]
+
+async def fetch_channels(channel_ids, concurrency):
+    """
+    Fetch channels from the API, at most `concurrency` at a time.
+    Returns ({channel_id: channel}, [(channel_id, error)]).
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    fetched = {}
+    errors = []
+
+    async def fetch(cid):
+        async with semaphore:
+            try:
+                fetched[cid] = await bot.fetch_channel(cid)
+            except discord.NotFound:
+                errors.append((cid, "NotFound"))
+            except discord.Forbidden:
+                errors.append((cid, "Forbidden"))
+            except discord.HTTPException as e:
+                errors.append((cid, f"HTTPException: {e}"))
+            except Exception as e:
+                errors.append((cid, f"Other: {e}"))
+
+    await asyncio.gather(*(fetch(cid) for cid in channel_ids))
+    return fetched, errors
+
 @bot.hybrid_command(
     name="backfill_guildids",
     description="Retroactively assign guild_id for cached messages where missing. Admin only."
 )
 @app_commands.describe(
     confirm="Set to true to actually perform the update. If false, the command will show what would be changed.",
-    fetch_unresolved="If true, attempt to fetch unresolved channel IDs from the Discord API (may be slow / rate-limited)."
+    fetch_unresolved="If true, attempt to fetch unresolved channel IDs from the Discord API (may be rate-limited)."
 )
 async def backfill_guildids(ctx, confirm: bool = False, fetch_unresolved: bool = True):
     """
     Maps messages rows with guild_id IS NULL by using bot.get_channel(channel_id)
     or, optionally, bot.fetch_channel(channel_id) for distinct channel_id present in the DB with NULL guild_id.
     - If confirm is False: reports counts and which channel_ids are mappable.
-    - If confirm is True: performs UPDATE ... WHERE guild_id IS NULL AND channel_id = ?
+    - If confirm is True: applies every mapping with joined UPDATEs, one transaction per chunk of message ids.
     Note: only channels the bot currently sees or can fetch will be backfilled.
     """
     if not is_guild_admin(ctx):
@@ -946,70 +1984,39 @@ async def backfill_guildids(ctx, confirm: bool = False, fetch_unresolved: bool =
 
     await ctx.defer(ephemeral=False)
 
-    cursor.execute("SELECT COUNT(*) FROM messages WHERE guild_id IS NULL")
-    total_null = cursor.fetchone()[0]
+    null_counts = await database.read(unassigned_counts_by_channel)
+    total_null = sum(null_counts.values())
     if total_null == 0:
         return await ctx.send("✅ No messages with NULL guild_id found. Nothing to backfill.")
 
-    # Get distinct channel IDs with missing guild_id
-    cursor.execute("SELECT DISTINCT channel_id FROM messages WHERE guild_id IS NULL")
-    rows = cursor.fetchall()
-    channel_ids = [r[0] for r in rows if r and r[0] is not None]
+    channel_ids = [cid for cid in null_counts if cid is not None]
 
     mappable = []
     unmappable = []
-    total_mappable_rows = 0
 
     # First pass: try to resolve from cache via bot.get_channel
     for cid in channel_ids:
         channel = bot.get_channel(cid)
         if channel and getattr(channel, "guild", None):
-            guild_obj = channel.guild
-            count = cursor.execute("SELECT COUNT(*) FROM messages WHERE guild_id IS NULL AND channel_id = ?", (cid,)).fetchone()[0]
-            if count > 0:
-                mappable.append((cid, guild_obj.id, guild_obj.name, channel.name, count))
-                total_mappable_rows += count
+            mappable.append((cid, channel.guild.id, channel.guild.name, channel.name, null_counts[cid]))
         else:
             unmappable.append(cid)
 
-    fetched_mappable = []
     fetch_errors = []
-    # Optionally attempt to fetch unresolved channels via API (for channels not in cache)
+    not_fetched = 0
+    # Optionally fetch unresolved channels via API (for channels not in cache); discord.py waits on rate limits
     if unmappable and fetch_unresolved:
-        fetch_limit = 50  # safety limit to avoid extremely long runs; adjust if needed
-        fetched_attempts = 0
-        for cid in list(unmappable):  # iterate on a copy since we may modify unmappable
-            if fetched_attempts >= fetch_limit:
-                break
-            try:
-                # Attempt to fetch the channel from the API
-                ch = await bot.fetch_channel(cid)
-                if ch and getattr(ch, "guild", None):
-                    guild_obj = ch.guild
-                    count = cursor.execute("SELECT COUNT(*) FROM messages WHERE guild_id IS NULL AND channel_id = ?", (cid,)).fetchone()[0]
-                    if count > 0:
-                        fetched_mappable.append((cid, guild_obj.id, guild_obj.name, getattr(ch, "name", "unknown"), count))
-                else:
-                    fetch_errors.append((cid, "no guild info"))
-                # If fetch succeeded remove from unmappable
-                if cid in unmappable:
-                    unmappable.remove(cid)
-                fetched_attempts += 1
-            except discord.NotFound:
-                fetch_errors.append((cid, "NotFound"))
-            except discord.Forbidden:
-                fetch_errors.append((cid, "Forbidden"))
-            except discord.HTTPException as e:
-                fetch_errors.append((cid, f"HTTPException: {e}"))
-            except Exception as e:
-                fetch_errors.append((cid, f"Other: {e}"))
-            # be gentle with the API
-            await asyncio.sleep(0.2)
+        fetch_limit = _env_number("BACKFILL_FETCH_LIMIT", 50)  # safety limit to avoid extremely long runs
+        not_fetched = max(0, len(unmappable) - fetch_limit)
+        fetched, fetch_errors = await fetch_channels(unmappable[:fetch_limit], _env_number("BACKFILL_FETCH_CONCURRENCY", 5))
+        for cid, ch in fetched.items():
+            if getattr(ch, "guild", None):
+                mappable.append((cid, ch.guild.id, ch.guild.name, getattr(ch, "name", "unknown"), null_counts[cid]))
+            else:
+                fetch_errors.append((cid, "no guild info"))
+        unmappable = [cid for cid in unmappable if cid not in fetched]
 
-    # accumulate totals including fetched
-    for cid, gid, gname, cname, cnt in fetched_mappable:
-        mappable.append((cid, gid, gname, cname, cnt))
-        total_mappable_rows += cnt
+    total_mappable_rows = sum(cnt for *_, cnt in mappable)
 
     # Build report
     report_lines = [
@@ -1029,6 +2036,8 @@ async def backfill_guildids(ctx, confirm: bool = False, fetch_unresolved: bool =
         report_lines.extend([f"- {cid}" for cid in unmappable[:25]])
         if len(unmappable) > 25:
             report_lines.append(f"... and {len(unmappable)-25} more")
+        if not_fetched:
+            report_lines.append(f"{not_fetched} of these were not fetched from the API (over BACKFILL_FETCH_LIMIT={fetch_limit}). Raise the limit to try them.")
 
     if fetch_errors:
         report_lines.append("")
@@ -1054,21 +2063,24 @@ async def backfill_guildids(ctx, confirm: bool = False, fetch_unresolved: bool =
             pass
         return
 
-    # Confirm is True: perform updates for all mappable (including fetched)
+    # Confirm is True: apply every mapping (including fetched), one transaction per chunk
     updated_total = 0
     updated_channels = 0
-    for cid, gid, gname, cname, cnt in mappable:
+    if mappable:
+        mapping = {cid: gid for cid, gid, *_ in mappable}
+        last_id = 0
         try:
-            cursor.execute("UPDATE messages SET guild_id = ? WHERE guild_id IS NULL AND channel_id = ?", (gid, cid))
-            updated = cursor.rowcount if cursor.rowcount and cursor.rowcount > 0 else cnt  # best-effort
-            if updated > 0:
+            while True:
+                updated, last_id = await database.write(assign_channel_guilds, mapping, last_id, REBUILD_CHUNK_SIZE)
+                if last_id is None:
+                    break
                 updated_total += updated
-                updated_channels += 1
+            updated_channels = len(mappable)
         except Exception as e:
-            report_lines.append(f"Error updating channel_id {cid}: {e}")
+            report_lines.append(f"Error applying updates: {e}")
+        result_cache.bump(gid for _, gid, *_ in mappable)
 
-    db.commit()
-    remaining_null = cursor.execute("SELECT COUNT(*) FROM messages WHERE guild_id IS NULL").fetchone()[0]
+    (remaining_null,) = await database.fetchone("SELECT COUNT(*) FROM messages WHERE guild_id IS NULL")
 
     report_lines.append("")
     report_lines.append(f"Applied updates to {updated_channels} channels, {updated_total} rows updated.")
@@ -1155,4 +2167,7 @@ if __name__ == "__main__":
     if not token or token.strip() == "" or token.strip().lower() == "none":
         print("❌ DISCORD_TOKEN environment variable is not set.")
     else:
+        # fork the graph workers while this is still the only thread: no database,
+        # event loop or aiohttp threads exist before bot.run()
+        graph_renderer.start()
         bot.run(token)
@@ -0,0 +1,221 @@
+"""
+Low-overhead runtime metrics: fixed-bucket histograms, plus gauges and counters read from callbacks.
+
+Recording a value costs a dict lookup, a bisect and a few additions under a
+lock, so it is cheap enough to do for every command, database call and stored
+message. Everything lives in memory; the ``stats`` command reads it back, and
+``render()`` produces the Prometheus text exposition format, which can be
+written to a file (for node_exporter's textfile collector) with
+``write_textfile`` or served on a local port with ``serve``.
+
+    metrics = Metrics()
+    metrics.histogram("command_latency_seconds", "Command latency.")
+    metrics.observe("command_latency_seconds", 0.042, command="count", status="ok")
+"""
+
+import bisect
+import math
+import os
+import threading
+import time
+
+# seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+LAG_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0, 21600.0, 86400.0)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Histogram:
+    """Counts of observed values per bucket (value <= bound), plus their sum, count and maximum."""
+
+    __slots__ = ("buckets", "counts", "sum", "count", "max")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # the last slot counts values above the largest bound
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        if value > self.max:
+            self.max = value
+
+    def copy(self):
+        other = Histogram(self.buckets)
+        other.counts = list(self.counts)
+        other.sum, other.count, other.max = self.sum, self.count, self.max
+        return other
+
+    def quantile(self, q):
+        """
+        Estimate of the q-quantile, interpolated linearly inside its bucket like
+        Prometheus' histogram_quantile(). Values past the largest bound are
+        estimated by the observed maximum. None if nothing was observed.
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                if i == len(self.buckets):
+                    return self.max
+                lower = self.buckets[i - 1] if i else 0.0
+                upper = min(self.buckets[i], self.max)
+                return lower + (upper - lower) * max(0.0, rank - seen) / n
+            seen += n
+        return self.max
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_number(value):
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+class Metrics:
+    """
+    A registry of named metrics. Metric names are prefixed with ``namespace``
+    when rendered. With ``enabled=False`` every recording call returns at once.
+
+    Safe to record from any thread.
+    """
+
+    def __init__(self, namespace="wordcount", enabled=True):
+        self.namespace = namespace
+        self.enabled = enabled
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        # name -> (kind, help, buckets, {label key: Histogram})
+        self._families = {}
+        # name -> (kind, help, {label key: callable returning a number})
+        self._callbacks = {}
+
+    # --- registration ---
+
+    def histogram(self, name, help, buckets=LATENCY_BUCKETS):
+        self._families[name] = ("histogram", help, tuple(buckets), {})
+
+    def gauge(self, name, help, fn, kind="gauge", **labels):
+        """
+        Register a value read from ``fn()`` whenever metrics are rendered, e.g. a
+        queue depth. Use kind="counter" for totals kept elsewhere. Registering the
+        same name again with other labels adds another series.
+        """
+        _, _, series = self._callbacks.setdefault(name, (kind, help, {}))
+        series[_label_key(labels)] = fn
+
+    # --- recording ---
+
+    def observe(self, name, value, **labels):
+        if not self.enabled:
+            return
+        series = self._families[name][3]
+        key = _label_key(labels)
+        with self._lock:
+            hist = series.get(key)
+            if hist is None:
+                hist = series[key] = Histogram(self._families[name][2])
+            hist.observe(value)
+
+    def observe_many(self, name, values, **labels):
+        """Observe several values for the same series under one lock acquisition."""
+        if not self.enabled:
+            return
+        series = self._families[name][3]
+        key = _label_key(labels)
+        with self._lock:
+            hist = series.get(key)
+            if hist is None:
+                hist = series[key] = Histogram(self._families[name][2])
+            for value in values:
+                hist.observe(value)
+
+    # --- reading ---
+
+    def series(self, name):
+        """{label dict as a tuple of (name, value) pairs: Histogram copy or number} for one metric."""
+        if name in self._callbacks:
+            return {key: fn() for key, fn in self._callbacks[name][2].items()}
+        with self._lock:
+            return {key: hist.copy() for key, hist in self._families[name][3].items()}
+
+    def render(self):
+        """Every metric in the Prometheus text exposition format."""
+        lines = []
+        for name, (kind, help, _, _) in self._families.items():
+            full = f"{self.namespace}_{name}"
+            lines.append(f"# HELP {full} {help}")
+            lines.append(f"# TYPE {full} {kind}")
+            for key, hist in sorted(self.series(name).items()):
+                cumulative = 0
+                for bound, n in zip(hist.buckets + (math.inf,), hist.counts):
+                    cumulative += n
+                    lines.append(f"{full}_bucket{_format_labels(key, [('le', _format_number(bound))])} {cumulative}")
+                lines.append(f"{full}_sum{_format_labels(key)} {_format_number(hist.sum)}")
+                lines.append(f"{full}_count{_format_labels(key)} {hist.count}")
+        for name, (kind, help, series) in self._callbacks.items():
+            full = f"{self.namespace}_{name}"
+            lines.append(f"# HELP {full} {help}")
+            lines.append(f"# TYPE {full} {kind}")
+            for key, fn in sorted(series.items()):
+                try:
+                    value = fn()
+                except Exception:
+                    continue
+                lines.append(f"{full}{_format_labels(key)} {_format_number(value)}")
+        lines.append(f"# HELP {self.namespace}_start_time_seconds When the process started recording metrics.")
+        lines.append(f"# TYPE {self.namespace}_start_time_seconds gauge")
+        lines.append(f"{self.namespace}_start_time_seconds {_format_number(self.started_at)}")
+        return "\n".join(lines) + "\n"
+
+
+# --- exporters ---
+
+def write_textfile(metrics, path):
+    """Write the rendered metrics to ``path`` atomically, so scrapers never read a partial file."""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as file:
+        file.write(metrics.render())
+    os.replace(tmp, path)
+
+
+async def serve(metrics, port, host="127.0.0.1"):
+    """
+    Serve ``GET /metrics`` on host:port (localhost only by default).
+    Returns the aiohttp runner; ``await runner.cleanup()`` stops it.
+    """
+    from aiohttp import web
+
+    async def handle(request):
+        return web.Response(body=metrics.render().encode("utf-8"), headers={"Content-Type": PROMETHEUS_CONTENT_TYPE})
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
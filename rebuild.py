@@ -0,0 +1,173 @@
+"""
+Offline rebuild of every word aggregate from the raw messages table.
+
+Run it with the bot stopped after changing tokenization rules or
+badwords_en.txt (stopword changes need no recount; they apply when reading,
+and the bot re-derives the toxicity tables itself when they change which bad
+words count):
+
+    python rebuild.py [--db wordcount.db] [--workers N] [--ranges-per-worker 8]
+
+It is also the upgrade step when a release changes AGGREGATES_VERSION: the bot
+only recounts small databases itself and exits on bigger ones (see UPGRADING.md).
+
+The message_id space is split into ranges that worker processes tokenize and
+count in parallel. Each partial result is added into fresh ``*_rebuild``
+tables as soon as it arrives (the upserts do the merging). Once every range is
+in, the new tables replace the live ones in a single transaction, so readers
+see either the old aggregates or the new ones, never a mix. If anything else
+wrote to the database in the meantime the swap is abandoned and the live
+tables are left as they were.
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from aggregates import (
+    AGGREGATE_TABLES, AGGREGATES_VERSION, REBUILD_CHUNK_SIZE,
+    AggregateCounts, create_aggregate_indexes, create_aggregate_tables,
+)
+from lexicon import (
+    STOPWORDS_PATH, TOXIC_WORDS_PATH, countable_toxic_words, load_stopwords, load_toxic_words, wordlist_hash,
+)
+
+SUFFIX = "_rebuild"
+
+# per-process state set up once by _init_worker
+_worker = {}
+
+
+def _init_worker(path, toxic_words):
+    _worker["conn"] = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    _worker["toxic_words"] = toxic_words
+
+
+def count_range(lo, hi):
+    """Count the messages with lo < message_id <= hi. Runs in a worker process."""
+    counts = AggregateCounts()
+    cur = _worker["conn"].execute(
+        "SELECT message_id, channel_id, author_id, content, timestamp, guild_id FROM messages "
+        "WHERE message_id > ? AND message_id <= ? AND guild_id IS NOT NULL",
+        (lo, hi)
+    )
+    while True:
+        rows = cur.fetchmany(REBUILD_CHUNK_SIZE)
+        if not rows:
+            break
+        counts.add(rows, _worker["toxic_words"])
+    return counts
+
+
+def split_ranges(cur, parts):
+    """
+    Split the messages into up to `parts` (lo, hi] message id ranges holding about the
+    same number of rows. Boundaries are every n-th id, from one pass over the primary key;
+    message rates vary too much over time for ranges of equal id span to balance.
+    """
+    (total,) = cur.execute("SELECT COUNT(*) FROM messages").fetchone()
+    if not total:
+        return []
+    step = max(1, -(-total // parts))
+    bounds = [row[0] for row in cur.execute(
+        "SELECT message_id FROM (SELECT message_id, ROW_NUMBER() OVER (ORDER BY message_id) AS n FROM messages) "
+        "WHERE n % ? = 0 OR n = ?",
+        (step, total)
+    )]
+    (lo,) = cur.execute("SELECT MIN(message_id) FROM messages").fetchone()
+    return list(zip([lo - 1] + bounds[:-1], bounds))
+
+
+def _drop_rebuild_tables(cur):
+    for table in AGGREGATE_TABLES:
+        cur.execute(f"DROP TABLE IF EXISTS {table}{SUFFIX}")
+
+
+def rebuild(path, workers=None, ranges_per_worker=8, toxic_words_path=TOXIC_WORDS_PATH, stopwords_path=STOPWORDS_PATH):
+    """
+    Rebuild the aggregates in the database at `path`. Returns the number of messages
+    counted, or None if the database changed during the rebuild and nothing was swapped in.
+    """
+    workers = workers or os.cpu_count() or 1
+    toxic_words = countable_toxic_words(load_toxic_words(toxic_words_path), load_stopwords(stopwords_path))
+
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL;")
+    conn.execute("PRAGMA busy_timeout=5000;")
+    cur = conn.cursor()
+    try:
+        columns = [r[1] for r in cur.execute("PRAGMA table_info(messages)").fetchall()]
+        if "guild_id" not in columns:
+            sys.exit("messages table has no guild_id column; start the bot once to migrate the database first.")
+        # changes whenever another connection commits, i.e. the bot wrote something
+        data_version = cur.execute("PRAGMA data_version").fetchone()[0]
+
+        ranges = split_ranges(cur, workers * ranges_per_worker)
+
+        cur.execute("BEGIN")
+        _drop_rebuild_tables(cur)
+        # secondary indexes are built once at the end, not maintained row by row
+        create_aggregate_tables(cur, SUFFIX, indexes=False)
+        cur.execute("COMMIT")
+
+        print(f"🔧 Rebuilding word aggregates: {len(ranges)} ranges on {workers} worker process(es)...")
+        start = time.perf_counter()
+        messages = 0
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(path, toxic_words)) as pool:
+            futures = [pool.submit(count_range, a, b) for a, b in ranges]
+            for done, future in enumerate(as_completed(futures), 1):
+                counts = future.result()
+                cur.execute("BEGIN")
+                counts.write(cur, SUFFIX)
+                cur.execute("COMMIT")
+                messages += counts.messages
+                if done % max(1, len(ranges) // 10) == 0 or done == len(ranges):
+                    print(f"🔁 {done}/{len(ranges)} ranges, {messages:,} messages counted")
+        counted = time.perf_counter() - start
+
+        cur.execute("BEGIN IMMEDIATE")
+        if cur.execute("PRAGMA data_version").fetchone()[0] != data_version:
+            cur.execute("ROLLBACK")
+            cur.execute("BEGIN")
+            _drop_rebuild_tables(cur)
+            cur.execute("COMMIT")
+            print("⚠️ The database was written to during the rebuild (is the bot running?). Nothing was changed.")
+            return None
+        for table in AGGREGATE_TABLES:
+            cur.execute(f"DROP TABLE IF EXISTS {table}")
+            cur.execute(f"ALTER TABLE {table}{SUFFIX} RENAME TO {table}")
+        create_aggregate_indexes(cur)
+        cur.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", [
+            ("aggregates_version", AGGREGATES_VERSION),
+            ("toxic_words_hash", wordlist_hash(toxic_words)),
+        ])
+        cur.execute("COMMIT")
+        elapsed = time.perf_counter() - start
+        rate = messages / counted if counted else 0.0
+        print(f"✅ Rebuilt word aggregates from {messages:,} messages in {elapsed:.1f}s ({rate:,.0f} msg/s counting).")
+        return messages
+    finally:
+        if conn.in_transaction:
+            conn.rollback()
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--db", default="wordcount.db")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument("--ranges-per-worker", type=int, default=8, help="more ranges balance uneven message density")
+    parser.add_argument("--badwords", default=TOXIC_WORDS_PATH)
+    parser.add_argument("--stopwords", default=STOPWORDS_PATH, help="bad words that are also stopwords do not count as toxic")
+    args = parser.parse_args()
+    if not os.path.exists(args.db):
+        sys.exit(f"{args.db} not found")
+    if rebuild(args.db, args.workers, args.ranges_per_worker, args.badwords, args.stopwords) is None:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
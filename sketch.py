@@ -0,0 +1,204 @@
+"""
+Approximate per-guild word frequencies in fixed memory, for ``top10 live``.
+
+Each tracked guild gets a Space-Saving summary (Metwally, Agrawal & El Abbadi,
+"Efficient Computation of Frequent and Top-k Elements in Data Streams", 2005)
+of the raw tokens of the messages ingested live. A summary monitors at most
+``capacity`` words, whatever the size of the vocabulary.
+
+Error bound, after N tokens have been added to a summary of capacity k:
+
+- every monitored word's estimate is never below its true count and at most
+  its own ``error`` above it, and every ``error`` is at most N / k;
+- any word that occurred more than N / k times is monitored.
+
+So a reported count is exact to within N / k, and a word is certainly in the
+top n if its estimate minus its error is at least the (n+1)-th estimate
+(``top`` reports this as ``guaranteed``). Stopwords are counted like everything
+else and left out when reading, as for the exact aggregates.
+
+Summaries are snapshotted to a JSON file together with the newest message id
+each one has seen, so a restart can catch up from the database.
+"""
+
+import heapq
+import json
+import os
+from operator import itemgetter
+
+from tokenizer import tokenize_many
+
+
+class SpaceSaving:
+    """
+    :param capacity: most words monitored at once (k). Memory is O(k).
+    """
+
+    def __init__(self, capacity=2048):
+        self.capacity = max(1, capacity)
+        self.total = 0
+        self.counts = {}
+        self.errors = {}
+        # one (count, word) entry per monitored word; the count may lag behind
+        # self.counts (increments do not touch the heap) but is never above it
+        self._heap = []
+
+    @property
+    def max_error(self):
+        """Upper bound on how far any estimate is above the true count: N / k."""
+        return self.total / self.capacity
+
+    def _settle(self):
+        """Refresh stale entries at the top of the heap until it holds the true minimum."""
+        heap, counts = self._heap, self.counts
+        while True:
+            count, word = heap[0]
+            current = counts[word]
+            if current == count:
+                return
+            heapq.heapreplace(heap, (current, word))
+
+    def add(self, word, n=1):
+        self.total += n
+        counts = self.counts
+        count = counts.get(word)
+        if count is not None:
+            counts[word] = count + n
+            return
+        if len(counts) < self.capacity:
+            counts[word] = n
+            self.errors[word] = 0
+            heapq.heappush(self._heap, (n, word))
+            return
+        # the new word takes over the least counted slot and inherits its count as error
+        self._settle()
+        floor, evicted = heapq.heappop(self._heap)
+        del counts[evicted]
+        del self.errors[evicted]
+        counts[word] = floor + n
+        self.errors[word] = floor
+        heapq.heappush(self._heap, (floor + n, word))
+
+    def update(self, words):
+        for word in words:
+            self.add(word)
+
+    def _floor(self):
+        # an unmonitored word occurred at most as often as the least counted monitored one
+        if len(self.counts) < self.capacity:
+            return 0
+        self._settle()
+        return self._heap[0][0]
+
+    def estimate(self, word):
+        """(estimate, error) for a word: its true count is between estimate - error and estimate."""
+        if word in self.counts:
+            return self.counts[word], self.errors[word]
+        floor = self._floor()
+        return floor, floor
+
+    def top(self, n=10, exclude=()):
+        """
+        [(word, estimate, error, guaranteed)] for the n most frequent words that are in none
+        of the ``exclude`` collections. ``guaranteed`` is True when the word is certainly
+        among the true top n of the words not excluded.
+        """
+        exclude = tuple(exclude)
+        # stopwords crowd the top, so rank a prefix and widen it until enough words are left
+        fetch = 4 * (n + 1)
+        while True:
+            ranked = heapq.nlargest(fetch, self.counts.items(), key=itemgetter(1))
+            kept = [(w, c) for w, c in ranked if not any(w in words for words in exclude)]
+            if len(kept) > n or len(ranked) < fetch:
+                break
+            fetch *= 4
+        # no word outside the list can have occurred more often than this
+        threshold = kept[n][1] if len(kept) > n else self._floor()
+        return [
+            (w, c, self.errors[w], c - self.errors[w] >= threshold)
+            for w, c in kept[:n]
+        ]
+
+    def to_dict(self):
+        return {
+            "capacity": self.capacity,
+            "total": self.total,
+            "words": [[w, c, self.errors[w]] for w, c in self.counts.items()],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        summary = cls(data["capacity"])
+        summary.total = data["total"]
+        for word, count, error in data["words"]:
+            summary.counts[word] = count
+            summary.errors[word] = error
+        summary._heap = [(c, w) for w, c in summary.counts.items()]
+        heapq.heapify(summary._heap)
+        return summary
+
+
+class GuildSketches:
+    """
+    Space-Saving summaries for a set of guilds, fed with message rows.
+
+    :param capacity: k for every guild's summary.
+    :param guild_ids: guilds to track, or None for every guild seen.
+    """
+
+    def __init__(self, capacity=2048, guild_ids=None):
+        self.capacity = capacity
+        self.guild_ids = set(guild_ids) if guild_ids is not None else None
+        self.sketches = {}
+        # guild_id -> newest message id added, for catching up after a restart
+        self.last_message_ids = {}
+
+    def tracks(self, guild_id):
+        return self.guild_ids is None or guild_id in self.guild_ids
+
+    def get(self, guild_id):
+        return self.sketches.get(guild_id)
+
+    def add_rows(self, rows):
+        """Add (message_id, channel_id, author_id, content, timestamp, guild_id) rows of tracked guilds."""
+        rows = [row for row in rows if row[5] is not None and self.tracks(row[5])]
+        for row, tokens in zip(rows, tokenize_many(row[3] for row in rows)):
+            guild_id = row[5]
+            summary = self.sketches.get(guild_id)
+            if summary is None:
+                summary = self.sketches[guild_id] = SpaceSaving(self.capacity)
+            summary.update(tokens)
+            if row[0] > self.last_message_ids.get(guild_id, 0):
+                self.last_message_ids[guild_id] = row[0]
+
+    def snapshot(self):
+        """Plain-data copy of every summary, safe to write out from another thread."""
+        return {
+            str(guild_id): dict(summary.to_dict(), last_message_id=self.last_message_ids.get(guild_id, 0))
+            for guild_id, summary in self.sketches.items()
+        }
+
+    @staticmethod
+    def write(path, snapshot):
+        """Write a ``snapshot()`` to ``path`` atomically."""
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as file:
+            json.dump(snapshot, file)
+        os.replace(tmp, path)
+
+    def save(self, path):
+        self.write(path, self.snapshot())
+
+    def load(self, path):
+        """Load summaries written by ``save`` (for tracked guilds with the same capacity). Returns how many."""
+        with open(path, "r", encoding="utf-8") as file:
+            data = json.load(file)
+        loaded = 0
+        for key, entry in data.items():
+            guild_id = int(key)
+            if not self.tracks(guild_id) or entry["capacity"] != self.capacity:
+                continue
+            self.sketches[guild_id] = SpaceSaving.from_dict(entry)
+            self.last_message_ids[guild_id] = entry.get("last_message_id", 0)
+            loaded += 1
+        return loaded
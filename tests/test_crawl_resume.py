@@ -0,0 +1,69 @@
+"""
+A failed batch write must not let the crawl checkpoint move past it.
+
+Runs ChannelCrawler against a FakeChannel with the bot's own crawl_progress
+writes, fails one write, then resumes from the saved checkpoint.
+"""
+
+import asyncio
+import importlib
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from crawler import ChannelCrawler, CrawlJob  # noqa: E402
+from fakes import FakeChannel, FakeGuild  # noqa: E402
+
+
+def test_failed_write_is_refetched_on_resume(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    main = importlib.import_module("main")
+    guild = FakeGuild(1)
+    channel = FakeChannel(1 << 32, guild, messages=1000)
+    ids = [m.id for m in channel.messages]
+
+    async def crawl(fail_batch=None):
+        progress = await main.database.write(prepare, channel)
+        written = 0
+
+        async def write(batch):
+            nonlocal written
+            written += 1
+            if written == fail_batch:
+                raise RuntimeError("disk full")
+            rows = [main.message_row(m, guild.id) for m in batch.messages]
+            status = "error" if batch.error else ("complete" if batch.done else "running")
+            await main.database.write(main.save_crawl_batch, channel.id, rows, batch.last_id, status,
+                                      str(batch.error) if batch.error else None)
+
+        crawler = ChannelCrawler(concurrency=1, page_size=100, batch_size=200)
+        await crawler.run([CrawlJob(channel, after=progress[channel.id][1])], write)
+        return await main.database.read(checkpoint, channel.id)
+
+    def prepare(cur, ch):
+        return main.prepare_crawl(cur, guild.id, [(ch.id, ch.last_message_id)], False)
+
+    def checkpoint(cur, channel_id):
+        status, last_id = cur.execute(
+            "SELECT status, last_message_id FROM crawl_progress WHERE channel_id = ?", (channel_id,)
+        ).fetchone()
+        stored = [r[0] for r in cur.execute(
+            "SELECT message_id FROM messages WHERE channel_id = ? ORDER BY message_id", (channel_id,)
+        )]
+        return status, last_id, stored
+
+    async def scenario():
+        status, last_id, stored = await crawl(fail_batch=2)
+        # the first batch of 200 was stored, the second was lost
+        assert status == "error"
+        assert last_id == ids[199]
+        assert stored == ids[:200]
+
+        status, last_id, stored = await crawl()
+        assert status == "complete"
+        assert stored == ids
+
+    asyncio.run(scenario())